@@ -0,0 +1,98 @@
+#!/usr/bin/python
+
+# Word-level alignment stage for batch_whisperx.py.
+#
+# Runs WhisperX forced alignment on a pool of CPU worker processes, so the
+# ASR worker can move on to the next file while earlier transcripts are
+# aligned. Each job rewrites its VTT with word-level WebVTT timestamp tags,
+# keeping any header block as-is.
+
+import os
+import concurrent.futures as cf
+import multiprocessing as mp
+
+import numpy as np
+
+from vtt_utils import read_vtt, write_vtt, word_timed_text
+
+# Per-worker cache of alignment models, keyed by language code
+_align_models = {}
+
+
+def _init_worker(n_threads):
+    import torch
+    torch.set_num_threads(n_threads)
+
+
+def _load_audio(audio_src, av_fpath):
+    import whisperx
+    # Cached decoded audio is memory-mapped instead of decoded again
+    if audio_src and audio_src.endswith(".npy") and os.path.exists(audio_src):
+        try:
+            return np.load(audio_src, mmap_mode="r")
+        except (OSError, ValueError):
+            pass
+    return whisperx.load_audio(av_fpath)
+
+
+# Align one transcript and rewrite its VTT. Runs in a worker process.
+def align_job(segments, language, av_fpath, vtt_fpath, audio_src=None):
+    import whisperx
+    if language not in _align_models:
+        _align_models[language] = whisperx.load_align_model(
+            language_code=language, device="cpu")
+    model_a, metadata = _align_models[language]
+
+    audio = _load_audio(audio_src, av_fpath)
+    aligned = whisperx.align(segments, model_a, metadata, audio, "cpu",
+                             return_char_alignments=False)
+
+    header, cues = read_vtt(vtt_fpath)
+    new_cues = []
+    for seg in aligned["segments"]:
+        words = seg.get("words") or []
+        text = word_timed_text(words) if words else seg["text"].strip()
+        new_cues.append({"start": seg["start"], "end": seg["end"], "text": text})
+    write_vtt(vtt_fpath, header, new_cues)
+    return vtt_fpath, sum(len(seg.get("words") or []) for seg in aligned["segments"])
+
+
+class AlignStage(object):
+    ''' Pool of CPU workers aligning finished transcripts in the background
+
+    : param n_workers  : Int, number of alignment worker processes
+    : param n_threads  : Int, torch threads per worker
+    : param max_pending: Int, jobs queued before submit() waits for one to finish
+    '''
+    def __init__(self, n_workers=2, n_threads=2, max_pending=None):
+        self._pool = cf.ProcessPoolExecutor(max_workers=n_workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_worker, initargs=(n_threads,))
+        self._max_pending = max_pending or 2 * n_workers
+        self._pending = set()
+        self.n_done, self.n_failed = 0, 0
+
+    def _collect(self, futures):
+        for fut in futures:
+            self._pending.discard(fut)
+            try:
+                vtt_fpath, n_words = fut.result()
+                print("Aligned ", n_words, " words in: ", vtt_fpath)
+                self.n_done += 1
+            except Exception as e:
+                print("Word alignment failed: ", e)
+                self.n_failed += 1
+
+    def submit(self, segments, language, av_fpath, vtt_fpath, audio_src=None):
+        # Backpressure: don't let unaligned transcripts pile up in memory
+        if len(self._pending) >= self._max_pending:
+            done, not_done = cf.wait(self._pending, return_when=cf.FIRST_COMPLETED)
+            self._collect(done)
+        self._pending.add(self._pool.submit(align_job, segments, language,
+            av_fpath, vtt_fpath, audio_src))
+
+    # Wait for all queued alignments, then shut the pool down
+    def close(self):
+        self._collect(list(cf.as_completed(self._pending)))
+        self._pool.shutdown()
+        print(f"Word alignment finished: {self.n_done} aligned, {self.n_failed} failed")
@@ -0,0 +1,125 @@
+#!/usr/bin/python
+
+# On-disk cache of decoded audio for the batch ASR scripts.
+#
+# Stores decoded 16 kHz mono float32 audio as .npy arrays keyed by a hash
+# of the source file's contents. Cached arrays are opened memory-mapped and
+# handed straight to transcribe(), so re-running a collection (new model,
+# changed settings) skips the ffmpeg decode entirely. The cache is bounded
+# by total size and evicts the least recently used arrays first.
+
+import os, json, hashlib, tempfile
+
+import numpy as np
+
+default_cache_mb = 20000
+hash_chunk_size = 1024 * 1024
+index_name = "index.json"
+
+
+# Hash the contents of a source A/V file
+def hash_file(fpath):
+    h = hashlib.blake2b(digest_size=20)
+    with open(fpath, "rb") as f:
+        for chunk in iter(lambda: f.read(hash_chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class AudioCache(object):
+    ''' Size-bounded LRU cache of decoded audio arrays
+
+    : param cache_dir: String, local folder for cached .npy arrays
+    : param max_mb   : Number, maximum total size of cached arrays in MB
+    '''
+    def __init__(self, cache_dir, max_mb=default_cache_mb):
+        self._dir = cache_dir
+        self._max_bytes = max_mb * 1024 * 1024
+        os.makedirs(self._dir, exist_ok=True)
+
+        # Maps "path|size|mtime" to content hash, so unchanged sources
+        # are not re-hashed on every run
+        self._index_path = os.path.join(self._dir, index_name)
+        try:
+            with open(self._index_path) as f:
+                self._index = json.load(f)
+        except (OSError, ValueError):
+            self._index = {}
+
+    def _array_path(self, key):
+        return os.path.join(self._dir, key + ".npy")
+
+    def _save_index(self):
+        fd, tmp_path = tempfile.mkstemp(dir=self._dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self._index_path)
+
+    def source_key(self, fpath):
+        st = os.stat(fpath)
+        stat_key = "|".join([os.path.abspath(fpath), str(st.st_size),
+                             str(st.st_mtime_ns)])
+        key = self._index.get(stat_key)
+        if key is None:
+            key = hash_file(fpath)
+            self._index[stat_key] = key
+            self._save_index()
+        return key
+
+    # Returns the decoded audio for fpath as a read-only memory-mapped
+    # float32 array. On a miss, decodes with decoder(fpath) and caches it.
+    def load(self, fpath, decoder):
+        key = self.source_key(fpath)
+        arr_path = self._array_path(key)
+
+        if os.path.exists(arr_path):
+            try:
+                audio = np.load(arr_path, mmap_mode="r")
+                os.utime(arr_path)          # Mark as recently used
+                print("Loaded decoded audio from cache: ", key)
+                return audio
+            except (OSError, ValueError):
+                print("Discarding unreadable cache entry: ", key)
+                os.remove(arr_path)
+
+        audio = np.ascontiguousarray(decoder(fpath), dtype=np.float32)
+        self.store(key, audio)
+        return audio
+
+    def store(self, key, audio):
+        # Write to a temp file first so readers never see partial arrays
+        fd, tmp_path = tempfile.mkstemp(dir=self._dir, suffix=".npy.tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, audio)
+            os.replace(tmp_path, self._array_path(key))
+        except OSError:
+            print("Unable to write decoded audio to cache: ", key)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self.evict()
+
+    # Remove least recently used arrays until the cache fits in max_mb
+    def evict(self):
+        entries = []
+        for name in os.listdir(self._dir):
+            if not name.endswith(".npy"):
+                continue
+            path = os.path.join(self._dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(e[1] for e in entries)
+        entries.sort()
+        while total > self._max_bytes and entries:
+            mtime, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+                total -= size
+                print("Evicted from audio cache: ", os.path.basename(path))
+            except OSError:
+                pass
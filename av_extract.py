@@ -0,0 +1,53 @@
+#!/usr/bin/python
+
+# Audio-only extraction for video inputs.
+#
+# Demuxes the first audio stream of a video container into a small
+# Matroska audio (.mka) sidecar, using a stream copy where the codec
+# allows it and falling back to lossless FLAC otherwise. Transcription
+# and audio caching then only ever read the sidecar.
+
+import os, subprocess
+
+video_file_exts = ["mov","mp4","webm","m4v","mpeg4"]
+audio_sidecar_ext = "mka"
+
+
+def is_video(fpath):
+    return os.path.splitext(fpath)[1][1:].lower() in video_file_exts
+
+
+def _run_ffmpeg(src, dst, codec_args):
+    cmd = ["ffmpeg", "-nostdin", "-y", "-v", "error",
+           "-i", src, "-map", "0:a:0", "-vn", "-sn", "-dn"] \
+        + codec_args + ["-f", "matroska", dst]
+    return subprocess.run(cmd, capture_output=True, text=True)
+
+
+# Extract the audio stream of a video file to [out_dir]/[stem].mka
+# Returns the sidecar path, or None if the file has no usable audio
+def extract_audio(src, out_dir=None):
+    out_dir = out_dir or os.path.dirname(src)
+    stem = os.path.splitext(os.path.basename(src))[0]
+    dst = os.path.join(out_dir, stem + "." + audio_sidecar_ext)
+    tmp_dst = dst + ".part"
+
+    try:
+        proc = _run_ffmpeg(src, tmp_dst, ["-c:a", "copy"])
+        if proc.returncode != 0:
+            print("Stream copy failed, re-encoding audio to FLAC: ",
+                  proc.stderr.strip())
+            proc = _run_ffmpeg(src, tmp_dst, ["-c:a", "flac"])
+    except OSError as e:
+        print("Unable to run ffmpeg: ", e)
+        return None
+
+    if proc.returncode != 0 or not os.path.exists(tmp_dst) \
+            or os.path.getsize(tmp_dst) == 0:
+        print("Audio extraction failed for: ", src, proc.stderr.strip())
+        if os.path.exists(tmp_dst):
+            os.remove(tmp_dst)
+        return None
+
+    os.replace(tmp_dst, dst)
+    return dst
@@ -3,30 +3,38 @@
 from datetime import datetime
 from enum import Enum
 
-import sys, os, csv, time, gc
-import argparse
+import sys, os, csv, time
+import argparse, contextlib
 
 import whisper, torch
 from whisper.utils import get_writer
 from pymediainfo import MediaInfo
 import iso639
-from iso3166_2 import *
+
+from fadgi import fadgi_types, fadgi_party1, fadgi_fileCreator
+from fadgi import reset_mdata, validate_mdata, parse_row_mdata, write_fadgi_block
+from mem_watermark import MemoryWatermark
+from row_profiler import RowProfiler, add_profile_args
+from audio_cache import AudioCache, default_cache_mb
+from work_queue import SQLiteWorkQueue, default_lease, default_node_name
+from segment_stats import result_stats, write_json, stats_path
+from quality_index import QualityIndex
+from s3_stream import stream_audio, object_size
+from shared_weights import load_shared_model
+from fallback_budget import FallbackMonitor, add_fallback_args
+from cascade import ModelCascade, add_cascade_args
+from csv_log import sidecar_log_path
+from transcribe_checkpoint import add_checkpoint_args, transcribe_checkpointed
+from transcribe_checkpoint import checkpoint_path, remove_checkpoints
 
 class result_state(Enum):
     ERROR = 0
     SUCCESS = 1
 
 # Constants for transcription
-av_file_exts = ["wav","mp3","m4a","mov","mp4","webm","m4v","mpeg4"]
+av_file_exts = ["wav","mp3","m4a","mka","mov","mp4","webm","m4v","mpeg4"]
 default_model = "large-v3"
-
-# Constants for embedding metadata
-fadgi_types = ["subtitle", "caption", "audio description",   # Vocab values for FADGI type
-                "chapters", "metadata"]  
-fadgi_party1 = "US, California Revealed"                     # Required value for FADGI Responsible Party
-fadgi_fileCreator = "OpenAI Whisper"                         # Required value for WebVTT creator
-
-iso = ISO3166_2()
+default_temperatures = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
 
 # Read in input/output locations from command-line
 # Args:
@@ -47,6 +55,51 @@ def get_args():
         parser.add_argument("--w_settings", default=None,
                            help="Text file containing settings for Whisper",
                            type=str, required=False)
+        parser.add_argument("--rss_watermark", default=None,
+                            help="RSS in MB above which to free memory between files",
+                            type=float, required=False)
+        parser.add_argument("--gpu_watermark", default=None,
+                            help="Reserved GPU memory in MB above which to free memory between files",
+                            type=float, required=False)
+        parser.add_argument("--mem_log", default=None,
+                            help="CSV of per-file memory stats. Defaults to [outlist]_memory.csv",
+                            type=str, required=False)
+        parser.add_argument("--audio_cache", default=None,
+                            help="Local folder for cached decoded audio, reused across runs",
+                            type=str, required=False)
+        parser.add_argument("--audio_cache_mb", default=default_cache_mb,
+                            help="Maximum size of the decoded audio cache in MB",
+                            type=float, required=False)
+        parser.add_argument("--queue", default=None,
+                            help="Shared SQLite work queue. Rows are claimed from the queue instead of read from inlist",
+                            type=str, required=False)
+        parser.add_argument("--node", default=None,
+                            help="Name of this node in the work queue. Defaults to [hostname]:[pid]",
+                            type=str, required=False)
+        parser.add_argument("--lease", default=default_lease,
+                            help="Seconds a claimed row stays leased without a heartbeat",
+                            type=float, required=False)
+        parser.add_argument("--stats_dir", default=None,
+                            help="Local folder for per-transcript segment statistics (JSON)",
+                            type=str, required=False)
+        parser.add_argument("--quality_db", default=None,
+                            help="SQLite quality index to record per-file transcript quality in",
+                            type=str, required=False)
+        parser.add_argument("--s3_stream", action="store_true",
+                            help="Decode media straight from the inlist S3 URI without downloading it")
+        parser.add_argument("--endpoint_url", default=None,
+                            help="S3 endpoint URL, e.g. for a local S3-compatible server",
+                            type=str, required=False)
+        parser.add_argument("--shared_weights", default=None,
+                            help="Memory-map CPU model weights prepared by shared_weights.py",
+                            type=str, required=False)
+        parser.add_argument("--cpu_threads", default=None,
+                            help="Torch threads for this process, when running several CPU workers per node",
+                            type=int, required=False)
+        add_fallback_args(parser)
+        add_cascade_args(parser)
+        add_checkpoint_args(parser)
+        add_profile_args(parser)
         args = parser.parse_args()
         return args
 
@@ -75,128 +128,196 @@ def exit_msg(msg, msg_arg):
     exit()
 
 
-def reset_mdata(mdata):
-    mdata = {
-        "type": fadgi_types[1],
-        "lang": "",
-        "party1": fadgi_party1,
-        "party2": "",
-        "mi": "",
-        "mi_type": "",
-        "og_file": "",
-        "f_creator": fadgi_fileCreator,
-        "fc_date": "",
-        "title": "",
-        "og_history": "",
-        "local_key1": "",
-        "local_value1": "",
-        "local_key2": "",
-        "local_value2": ""
-    }
-    return mdata
-
-def validate_mdata(mdata):
-    # Is Type compliant with FADGI type vocab?
-    if not mdata["type"] in fadgi_types:
-        return "Provided WebVTT type does not comply with FADGI vocabulary"
-
-    # Do party fields have [Country], [Name] structure?
+# Read Whisper settings from a text file of key=value lines
+def read_w_settings(fpath):
+    w_settings = {}
+    line_tokens = []
     try:
-        p1_tokens = mdata["party1"].split(',')
-        p1_country, p1_name = p1_tokens[0], p1_tokens[1]
+        with open(fpath) as ws:
+            for line in ws.readlines():
+                line_tokens = line.split("=")
+                key = line_tokens[0]
+                value = line_tokens[1].strip()
+
+                print(key, "=", value)
+                
+                if ((value == 'True') or (value == 'False')):
+                    w_settings.update({key: eval(value)})
+                else:
+                    try:
+                        v_int = int(value)
+                        v_float = float(value)
+
+                        if v_int == v_float:
+                            w_settings.update({key: v_int})
+                        else:
+                            w_settings.update({key: v_float})
+                    except:
+                        w_settings.update({key: value})
     except:
-        return "Responsible Party 1 does not follow [Country], [Partner Name] formatting"
+        exit_msg("Bad whisper_settings line:", line_tokens)
+    return w_settings
+
+
+# Build DecodingOptions dict from w_settings
+def get_decode_options(w_settings):
+    decode_options = {
+        'task': w_settings.get("task", "transcribe"),
+        'language': w_settings.get("language", None),
+        'sample_len': w_settings.get("sample_len", None),
+        'best_of': w_settings.get("best_of", None),
+        'beam_size': w_settings.get("beam_size", None),
+        'patience': w_settings.get("patience", None),
+        'length_penalty': w_settings.get("length_penalty", None),
+        'prompt': w_settings.get("prompt", None),
+        'prefix': w_settings.get("prefix", None),
+        'suppress_tokens': w_settings.get("suppress_tokens", "-1"),
+        'suppress_blank': w_settings.get("suppress_blank", True),
+        'without_timestamps': w_settings.get("without_timestamps", False),
+        'max_initial_timestamp': w_settings.get("max_initial_timestamp", 1.0),
+        'fp16': w_settings.get("fp16", True)}
+    return decode_options
+
+
+# Load the Whisper model named in w_settings, or the default model
+# Returns (model, name of the model actually loaded)
+def load_asr_model(w_settings, device):
     try:
-        p2_tokens = mdata["party2"].split(',')
-        p2_country, p2_name = p2_tokens[0], p2_tokens[1]
+        print("Loading model from w_settings: ", w_settings["model"])
+        model_name = w_settings.pop("model")
+        model = whisper.load_model(model_name, w_settings.pop("device", device))
     except:
-        return "Responsible Party 2 does not follow [Country], [Partner Name] formatting"
+        print("Loading default model: ", default_model)
+        model_name = default_model
+        model = whisper.load_model(default_model, device)
+    print("Device: ", model.device)
+    return model, model_name
+
+
+# Pre-transcription checks on a source A/V file
+# Returns an error message, or "" if the file can be transcribed
+def check_av_file(av_fpath, av_fname, out_fpath):
+    av_f_ext = ((os.path.splitext(av_fname))[1])[1:]
+
+    # Check if target file exists
+    if not (os.path.exists(av_fpath)):
+        print("Filepath does not exist for: ", av_fname)
+        return "Target filepath does not exist. Skipping file."
+
+    # Check if target file is an A/V file
+    if not(av_f_ext in av_file_exts):
+        return "Not a supported A/V file. Skipping file."
+
+    # Check that filesize > 0B
+    if os.path.getsize(av_fpath) == 0:
+        return "Blank file. Skipping file."
+
+    # Check if the file has already been transcribed
+    if (os.path.exists(out_fpath)):
+        return "This file has already been transcribed. Skipping file."
+
+    # Check if the file has at least one audio track
+    file_mi = MediaInfo.parse(av_fpath)
+    if (len(file_mi.audio_tracks) == 0):
+        return "No audio tracks to transcribe. Skipping file."
+
+    # Check that at least 1 audio track is not blank
+    skip = 0
+    for at in file_mi.audio_tracks:
+        if at.duration > 0: break
+        else: skip+=1
+    if skip == len(file_mi.audio_tracks):
+        return "All audio tracks blank. Skipping file."
+    return ""
 
-    # Do party fields have ISO-compliant country codes?    
-    try: iso[p1_country]
-    except:
-        return "Country code for Responsible Party 1 does not comply with ISO 3166-2"
 
-    try: iso[p2_country]
-    except:
-        return "Country code for Responsible Party 2 does not comply with ISO 3166-2"
+# Pre-transcription checks for a source streamed from S3
+# Returns an error message, or "" if the object can be transcribed
+def check_s3_file(client, s3_uri, av_fname, out_fpath):
+    av_f_ext = ((os.path.splitext(av_fname))[1])[1:]
+    if not(av_f_ext in av_file_exts):
+        return "Not a supported A/V file. Skipping file."
+    if (os.path.exists(out_fpath)):
+        return "This file has already been transcribed. Skipping file."
 
-    # Does media identifier follow CA-R object_identifier format?
-    mi_tokens = mdata["mi"].split('_')
-    if len(mi_tokens) != 2:
-        return "Object Identifier does not have correct number of underscores"
+    # Same size check as check_av_file, from the object's metadata
     try:
-        obj_number = int(mi_tokens[1])
+        size = object_size(client, s3_uri)
     except:
-        return "Object Identifier does not contain a number in expected position"
-
-    # Does MI Type is local?
-    if mdata["mi_type"] != "local":
-        return "Media Identifier Type for CA-R object identifier is not local"
-
-    # Are both key and value present for local pairs?
-    keys = (k for k in mdata.keys() if 'local_key' in k)
-    values = (v for v in mdata.keys() if 'local_value' in v)
-    for k, v in zip(keys, values):
-        if bool(mdata[k]) != bool(mdata[v]):
-            return "Key and Value Fields must be used together if using Local Usage Elements"
+        print("S3 object not found for: ", av_fname)
+        return "Target filepath does not exist. Skipping file."
+    if size == 0:
+        return "Blank file. Skipping file."
     return ""
 
-# Adds strongly-recommended metadata to WebVTT file header,
-# following FADGI recommendations outined in 
-# 'Guidelines for Embedding Metadata in WebVTT Files'
-# June 7, 2024 version
-#
-# Needs: filepath of VTT, use to create file object
-def write_fadgi_block(fpath, mdata):
-    # Validate provided filepath for webVTT metadata embedding
-    if not fpath:
-        print("write_fadgi_block: Empty filepath")
-        return False
-    elif not os.path.exists(fpath):
-        print("write_fadgi_block: Filepath does not exist for: ", fpath)
-        return False
-    elif fpath.split(".")[-1] != "vtt":
-        print("write_fadgi_block: Expected VTT file")
-        return False
-
-    with open(fpath, "r") as f_reader:
-        lines = f_reader.readlines()
-
-    # Comments show example output for WebVTT embedded metadata
-    # [brackets] indicate values from corresponding field names in AV Data Baseline reports
-    with open(fpath, "w") as f_writer:
-        f_writer.write(lines[0])
-        lines.pop(0)
-
-        f_writer.write("\n" + "Type: " + mdata["type"] + "\n")      # Type: caption
-        f_writer.write("Language: " + mdata["lang"] + "\n")         # Type: language specified or detected during transcription 
-        f_writer.write("Responsible Party: " + mdata["party1"]       
-            + "; " +  mdata["party2"] + "\n")                       # Responsible party: US, California Revealed; US, [Partner Name]
-        f_writer.write("Media Identifier: " + mdata["mi"]            
-            + ", " + mdata["mi_type"] + "\n")                       # Media Identifier: [obj_object_identifier], local
-        f_writer.write("Originating File: " 
-            + mdata["og_file"] + "\n")                              # Originating File: [obj_object_identifier]_t1_access.mp3
-        f_writer.write("File Creator: " 
-            + mdata["f_creator"] + "\n")                            # File Creator: OpenAI Whisper         
-        f_writer.write("File Creation Date: " 
-            + mdata["fc_date"] + "\n")                              # File Creation Date: 2025-06-27
-        f_writer.write("Title: " + mdata["title"] + "\n")           # Title: [label]                       
-        f_writer.write("Origin History: " 
-            + mdata["og_history"] + "\n")                           # Origin History: Created in response to 2024 website accessibility audit
-
-        if (mdata["local_key1"] != "" and mdata["local_value1"] != ""):
-            f_writer.write(mdata["local_key1"] + ": " 
-                + mdata["local_value1"] + "\n")
-
-        if (mdata["local_key2"] != "" and mdata["local_value2"] != ""):
-            f_writer.write(mdata["local_key2"] + ": " 
-                + mdata["local_value2"] + "\n")
-
-        for l in lines:
-            f_writer.write(l)
-
-    return True
+
+# Run Whisper ASR on a filepath or decoded audio array
+def run_transcribe(model, audio, w_settings, decode_options, device):
+    cuda_ctx = torch.cuda.device(device) if str(device).startswith("cuda") \
+        else contextlib.nullcontext()
+    with cuda_ctx:
+        result = model.transcribe(
+            audio,
+            verbose=w_settings.get("verbose", False),
+            temperature=w_settings.get("temperature", default_temperatures),
+            logprob_threshold=w_settings.get("logprob_threshold", -1.0),
+            no_speech_threshold=w_settings.get("no_speech_threshold", 0.6),
+            condition_on_previous_text=w_settings.get("condition_on_previous_text", False),
+            initial_prompt=w_settings.get("initial_prompt", None),
+            word_timestamps=w_settings.get("word_timestamps", False),
+            clip_timestamps=w_settings.get("clip_timestamps", "0"),
+            hallucination_silence_threshold=w_settings.get("hallucination_silence_threshold", None),
+            **decode_options)  
+    return result
+
+
+# Run Whisper ASR, checkpointing long files to checkpoint_dir if set
+def run_transcribe_resumable(model, model_name, audio, w_settings,
+        decode_options, device, checkpoint_dir, interval, source, fname):
+    if not checkpoint_dir:
+        return run_transcribe(model, audio, w_settings, decode_options, device)
+
+    # Chunks after the first keep the first chunk's language
+    def transcribe_chunk(chunk, language):
+        chunk_options = decode_options
+        if language:
+            chunk_options = dict(decode_options, language=language)
+        return run_transcribe(model, chunk, w_settings, chunk_options, device)
+
+    return transcribe_checkpointed(transcribe_chunk, audio,
+        checkpoint_path(checkpoint_dir, fname, model_name), source,
+        model_name, interval)
+
+
+# Validate transcription language, write the VTT and embed FADGI metadata
+# Returns an error message, or "" on success
+def finalize_vtt(result, out_fpath, mdata):
+    # Validate langauge of transcription output
+    if not (iso639.is_language(result["language"], "pt1")):
+        print("Non-ISO 639-3 language code provided")
+        return "Non-ISO 639-3 language code provided"
+    
+    #Convert Whisper's ISO 639-2 lang code to FADGI's 639-3 code
+    lang = iso639.Lang(result["language"])
+    mdata["lang"] = lang.pt3
+    print("Passed checks on transcription output")
+
+    #Write transcription output to new VTT file
+    try:
+        with open(out_fpath, "x+") as out_f:
+            vtt_writer = get_writer("vtt", out_fpath)
+            vtt_writer.write_result(result, out_f)
+        print("Wrote transcription output to WebVTT file")
+    except:
+        print("Failed to write to VTT file.")
+        return "Failed to write VTT"
+
+    print("Attempting metadata embed")
+    if (write_fadgi_block(out_fpath, mdata) == False):
+        print("Failed to embed metadata")
+        return "Failed to embed metadata to VTT"
+    print("Embedded metadata")
+    return ""
 
 def main():
     # INPUT VALIDATION
@@ -227,71 +348,72 @@ def main():
         print("Whisper settings file ", args.w_settings, " not found.")
         print("Using default settings instead")
         w_default = True
+    if args.stats_dir and not os.path.exists(args.stats_dir):
+        os.makedirs(args.stats_dir)
+    if args.checkpoint_dir and not os.path.exists(args.checkpoint_dir):
+        os.makedirs(args.checkpoint_dir)
     print("Validated args")
 
     # Set up Whisper
-    torch.cuda.init()
-    device = "cuda:0" if torch.cuda.is_available() else "cpu"
+    if torch.cuda.is_available() and not args.shared_weights:
+        torch.cuda.init()
+        device = "cuda:0"
+    else:
+        device = "cpu"
+    if args.cpu_threads:
+        torch.set_num_threads(args.cpu_threads)
     print("device: ", device)
 
-    # Read and validate from whisper_settings
-    # May need to revisit if we're just hard-coding
-    w_settings = {}
-    line_tokens = []
-
-    if (not w_default):
-        try:
-            with open(args.w_settings) as ws:
-                for line in ws.readlines():
-                    line_tokens = line.split("=")
-                    key = line_tokens[0]
-                    value = line_tokens[1].strip()
-
-                    print(key, "=", value)
-                    
-                    if ((value == 'True') or (value == 'False')):
-                        w_settings.update({key: eval(value)})
-                    else:
-                        try:
-                            v_int = int(value)
-                            v_float = float(value)
-
-                            if v_int == v_float:
-                                w_settings.update({key: v_int})
-                            else:
-                                w_settings.update({key: v_float})
-                        except:
-                            w_settings.update({key: value})
-        except:
-            exit_msg("Bad whisper_settings line:", line_tokens)
-
-    # Build DecodingOptions dict from w_settings
-    decode_options = {
-        'task': w_settings.get("task", "transcribe"),
-        'language': w_settings.get("language", None),
-        'sample_len': w_settings.get("sample_len", None),
-        'best_of': w_settings.get("best_of", None),
-        'beam_size': w_settings.get("beam_size", None),
-        'patience': w_settings.get("patience", None),
-        'length_penalty': w_settings.get("length_penalty", None),
-        'prompt': w_settings.get("prompt", None),
-        'prefix': w_settings.get("prefix", None),
-        'suppress_tokens': w_settings.get("suppress_tokens", "-1"),
-        'suppress_blank': w_settings.get("suppress_blank", True),
-        'without_timestamps': w_settings.get("without_timestamps", False),
-        'max_initial_timestamp': w_settings.get("max_initial_timestamp", 1.0),
-        'fp16': w_settings.get("fp16", True)}
-
+    w_settings = {} if w_default else read_w_settings(args.w_settings)
+    decode_options = get_decode_options(w_settings)
     print(decode_options)
-
-    try:
-        print("Loading model from w_settings: ", w_settings["model"])
-        model = whisper.load_model(w_settings.pop("model"), 
-            w_settings.pop("device"))
-    except:
-        print("Loading default model: ", default_model)
-        model = whisper.load_model(default_model, device)
-    print("Device: ", model.device)
+    if args.checkpoint_dir and str(w_settings.get("clip_timestamps", "0")) != "0":
+        print("Checkpoints are not used with clip_timestamps in w_settings")
+        args.checkpoint_dir = None
+
+    if args.shared_weights:
+        # Weights are shared read-only with other CPU workers on this node
+        model, model_name = load_shared_model(args.shared_weights)
+        w_settings.pop("model", None); w_settings.pop("device", None)
+    else:
+        model, model_name = load_asr_model(w_settings, device)
+
+    mem = MemoryWatermark(log_path=args.mem_log or sidecar_log_path(args.outlist, "_memory.csv"),
+        rss_watermark=args.rss_watermark, gpu_watermark=args.gpu_watermark,
+        device=model.device)
+
+    cascade = None
+    asr_models = [(model, model_name)]
+    if args.cascade_model:
+        # Fast first-pass model; the model above only runs on escalation
+        print("Loading cascade fast model: ", args.cascade_model)
+        fast_model = whisper.load_model(args.cascade_model, device)
+        asr_models.append((fast_model, args.cascade_model))
+        cascade = ModelCascade(fast_model,
+            args.cascade_model, model_name, args.cascade_threshold,
+            args.cascade_no_speech,
+            args.cascade_log or sidecar_log_path(args.outlist, "_cascade.csv"))
+
+    # Count and budget fallbacks on every model that transcribes
+    fallback = FallbackMonitor.from_args(args, asr_models,
+        w_settings.get("temperature", default_temperatures), args.outlist)
+
+    audio_cache = None
+    if args.audio_cache:
+        audio_cache = AudioCache(args.audio_cache, args.audio_cache_mb)
+        print("Using decoded audio cache at: ", args.audio_cache)
+
+    s3_client = None
+    if args.s3_stream:
+        import boto3                    # Only needed to stream from S3
+        s3_client = boto3.client("s3", endpoint_url=args.endpoint_url)
+        print("Streaming media from S3 URIs in inlist")
+
+    quality_index = None
+    if args.quality_db:
+        quality_index = QualityIndex(args.quality_db)
+
+    profiler = RowProfiler.from_args(args, args.outlist)
 
     obj_mdata = {}
 
@@ -299,9 +421,18 @@ def main():
     with open(args.inlist, newline='') as inlist_obj:
         in_reader = csv.reader(inlist_obj, delimiter=',')
 
-        n_rows = sum(1 for row in inlist_obj)
+        n_rows = sum(1 for row in inlist_obj) - 1     # minus header
         inlist_obj.seek(0); next(in_reader)
 
+        # Work-queue mode: load inlist into the shared queue (rows already
+        # queued by other nodes are ignored) and claim rows under lease
+        if args.queue:
+            work_queue = SQLiteWorkQueue(args.queue, lease=args.lease)
+            node = args.node or default_node_name()
+            print("Added rows to work queue: ", work_queue.load_inlist(args.inlist))
+            print("Claiming rows from work queue as node: ", node)
+            in_reader = work_queue.iter_rows(node)
+
         obj_mdata = reset_mdata(obj_mdata)
 
         with open(args.outlist, "a", newline='') as outlist_obj:
@@ -310,28 +441,20 @@ def main():
             prev_result, prev_file = "",""
 
             for row in in_reader:
-                print(f"Row {i} of {n_rows}")
-
                 t_start = time.perf_counter()
                 i+=1
+                # Rows count from 1, in the log and for --profile_rows
+                print(f"Row {i} of {n_rows}")
+                if profiler is not None:
+                    profiler.start_row(i, row[1])
 
                 # Build filename for output transcript            
                 av_fpath, av_fname = row[0], row[1]
-                av_f_ext = ((os.path.splitext(av_fname))[1])[1:]
                 out_fname = (os.path.splitext(av_fname))[0] + ".vtt"
                 out_fpath = args.outdir + "/" + out_fname
                 
                 # Parse FADGI metadata values from intake sheet to dict
-                obj_mdata["party2"] = row[3]
-                obj_mdata["mi"] = row[4]
-                obj_mdata["mi_type"] = row[5]
-                obj_mdata["og_file"] = av_fname
-                obj_mdata["title"] = row[6]
-                obj_mdata["og_history"] = row[7]
-                obj_mdata["local_key1"] = row[8]
-                obj_mdata["local_value1"] = row[9]
-                obj_mdata["local_key2"] = row[10]
-                obj_mdata["local_value2"] = row[11]
+                parse_row_mdata(row, obj_mdata)
 
                 mdata_check = validate_mdata(obj_mdata)
                 if mdata_check:
@@ -342,88 +465,56 @@ def main():
 
                 print("Attempting Whisper transcription for: ", av_fname)
 
-                # Check if target file exists
-                if not (os.path.exists(av_fpath)):
-                    print("Filepath does not exist for: ", av_fname)
-                    update_log(out_writer, fpath=av_fpath,fname=av_fname,
-                        msg="Target filepath does not exist. Skipping file.",
-                        t_start=t_start, end_state=result_state.ERROR.name)
-                    prev_file = av_fname
-                    continue
-
-                # Check if target file is an A/V file
-                if not(av_f_ext in av_file_exts):
-                    update_log(out_writer, fpath=av_fpath, fname=av_fname,
-                        msg="Not a supported A/V file. Skipping file.",
-                        t_start=t_start, end_state=result_state.ERROR.name)
-                    prev_file = av_fname
-                    continue
-
-                # Check that filesize > 0B
-                if os.path.getsize(av_fpath) == 0:
+                # In stream mode the S3 URI is the source, and is what gets logged
+                if args.s3_stream:
+                    av_fpath = row[2]
+                    file_check = check_s3_file(s3_client, av_fpath, av_fname, out_fpath)
+                else:
+                    file_check = check_av_file(av_fpath, av_fname, out_fpath)
+                if file_check:
                     update_log(out_writer, fpath=av_fpath, fname=av_fname,
-                        msg="Blank file. Skipping file.",
+                        msg=file_check,
                         t_start=t_start, end_state=result_state.ERROR.name)
                     prev_file = av_fname
                     continue
 
-                # Check if the file has already been transcribed
-                if (os.path.exists(out_fpath)):
-                    update_log(csv_writer=out_writer, fpath=av_fpath, 
-                        fname=av_fname,
-                        msg="This file has already been transcribed. Skipping file.",
-                        t_start=t_start, end_state=result_state.ERROR.name)
-                    prev_file = av_fname
-                    continue
-
-                # Check if the file has at least one audio track
-                file_mi = MediaInfo.parse(av_fpath)
-                if (len(file_mi.audio_tracks) == 0):
-                    update_log(csv_writer=out_writer, fpath=av_fpath, 
-                        fname=av_fname,
-                        msg="No audio tracks to transcribe. Skipping file.",
-                        t_start=t_start, end_state=result_state.ERROR.name)
-                    prev_file = av_fname
-                    continue
-
-                # Check that at least 1 audio track is not blank
-                skip = 0
-                for at in file_mi.audio_tracks:
-                    if at.duration > 0: break
-                    else: skip+=1
-                if skip == len(file_mi.audio_tracks):
-                    update_log(out_writer, av_fpath, av_fname,
-                        msg="All audio tracks blank. Skipping file.",
-                        t_start=t_start, end_state=result_state.ERROR.name)
-                    prev_file=av_fname
-                    continue
-
                 print("Passed pre-transcription file checks")
 
+                mem.start_file()
+                fallback.start_file()
                 try:
                     #Try ASR transcription                    
-                    with torch.cuda.device(device):
-                        result = model.transcribe(
-                            av_fpath,
-                            verbose=w_settings.get("verbose", False),
-                            temperature=w_settings.get("temperature", (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)),
-                            logprob_threshold=w_settings.get("logprob_threshold", -1.0),
-                            no_speech_threshold=w_settings.get("no_speech_threshold", 0.6),
-                            condition_on_previous_text=w_settings.get("condition_on_previous_text", False),
-                            initial_prompt=w_settings.get("initial_prompt", None),
-                            word_timestamps=w_settings.get("word_timestamps", False),
-                            clip_timestamps=w_settings.get("clip_timestamps", "0"),
-                            hallucination_silence_threshold=w_settings.get("hallucination_silence_threshold", None),
-                            **decode_options)  
+                    # Decode once per source; reuse cached audio on reruns
+                    if s3_client is not None:
+                        audio = stream_audio(s3_client, av_fpath)
+                    elif audio_cache is not None:
+                        audio = audio_cache.load(av_fpath, whisper.load_audio)
+                    elif cascade is not None or args.checkpoint_dir:
+                        # Decode once for all cascade passes and checkpoint chunks
+                        audio = whisper.load_audio(av_fpath)
+                    else:
+                        audio = av_fpath
+                    transcribe_fn = lambda m, m_name, a: run_transcribe_resumable(
+                        m, m_name, a, w_settings, decode_options, device,
+                        args.checkpoint_dir, args.checkpoint_interval,
+                        av_fpath, out_fname)
+                    if cascade is not None:
+                        result, f_cascade = cascade.transcribe(av_fname, audio,
+                            model, transcribe_fn)
+                    else:
+                        result = transcribe_fn(model, model_name, audio)
                 except:
                     print("Transcription failed for: ", av_fname)  
+                    mem.end_file(av_fname)
+                    fallback.end_file(av_fname)
                     update_log(out_writer, av_fpath, av_fname,
                         msg="Transcription failed", t_start=t_start,
                         end_state=result_state.ERROR.name)
                     continue
 
                 obj_mdata["fc_date"] = datetime.today().strftime('%Y-%m-%d')
-                gc.collect(); torch.cuda.empty_cache()   
+                mem.end_file(av_fname)
+                f_fallback = fallback.end_file(av_fname)
 
                 # Skip writing to VTT if blank transcript (no speech)
                 if result["text"] == "":
@@ -444,42 +535,29 @@ def main():
                 else:
                     prev_result, prev_file = result, av_fname  
 
-                # Validate langauge of transcription output
-                if not (iso639.is_language(result["language"], "pt1")):
-                    print("Non-ISO 639-3 language code provided")
+                # Validate language, write VTT and embed FADGI metadata
+                vtt_check = finalize_vtt(result, out_fpath, obj_mdata)
+                if vtt_check:
                     update_log(out_writer, out_fpath, out_fname,
-                        msg="Non-ISO 639-3 language code provided",
-                        t_start=t_start,
-                        end_state=result_state.ERROR.name)
-                    continue
-                
-                #Convert Whisper's ISO 639-2 lang code to FADGI's 639-3 code
-                lang = iso639.Lang(result["language"])
-                obj_mdata["lang"] = lang.pt3
-                print("Passed checks on transcription output")
-
-                #Write transcription output to new VTT file
-                try:
-                    with open(out_fpath, "x+") as out_f:
-                        vtt_writer = get_writer("vtt", out_fpath)
-                        vtt_writer.write_result(result, out_f)
-                except:
-                    print("Failed to write to VTT file.")
-                    update_log(out_writer, out_fpath, out_fname,
-                        msg="Failed to write VTT", t_start=t_start,
+                        msg=vtt_check, t_start=t_start,
                         end_state=result_state.ERROR.name)
                     continue
-                    print("Wrote transcription output to WebVTT file")
 
-                print("Attempting metadata embed")
-                if (write_fadgi_block(out_fpath, obj_mdata) == False):
-                    print("Failed to embed metadata")
-                    update_log(out_writer, out_fpath, out_fname,
-                        msg="Failed to embed metadata to VTT",
-                        t_start=t_start,
-                        end_state=result_state.ERROR.name)
-                    continue
-                print("Embedded metadata")
+                # Save segment statistics for later repair and triage
+                f_extra = {"fallback": f_fallback}
+                if cascade is not None:
+                    f_extra["cascade"] = f_cascade
+                f_stats = result_stats(result, av_fpath,
+                    f_cascade["model"] if cascade is not None else model_name,
+                    extra=f_extra)
+                if args.stats_dir:
+                    try:
+                        write_json(stats_path(args.stats_dir, out_fname), f_stats)
+                    except OSError:
+                        print("Unable to write segment statistics for: ", out_fname)
+                if quality_index is not None:
+                    quality = quality_index.add(out_fname, f_stats)
+                    print("Transcript quality score: ", round(quality["score"], 3))
 
                 # Write results to log file
                 print("Successfully created transcript: ", out_fname)
@@ -487,9 +565,17 @@ def main():
                     msg="Successful transcription",
                     t_start=t_start,
                     end_state=result_state.SUCCESS.name)
+                if args.checkpoint_dir:
+                    remove_checkpoints(args.checkpoint_dir, out_fname)
 
             print("\n")
-    
+
+    if profiler is not None:
+        profiler.close()
+    if cascade is not None:
+        cascade.close()
+    fallback.close()
+    mem.close()
     print("Transcript file locations written to: " + args.outdir)
 
 if __name__=="__main__":
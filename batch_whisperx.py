@@ -9,11 +9,17 @@ import argparse
 import faster_whisper, whisperx, whisperx.utils, torch
 from pymediainfo import MediaInfo
 
+from mem_watermark import MemoryWatermark
+from csv_log import sidecar_log_path
+from row_profiler import RowProfiler, add_profile_args
+from audio_cache import AudioCache, default_cache_mb
+from align_stage import AlignStage
+
 class result_state(Enum):
     ERROR = 0
     SUCCESS = 1
 
-av_file_exts = ["wav","mp3","m4a","mov","mp4","webm","m4v","mpeg4"]
+av_file_exts = ["wav","mp3","m4a","mka","mov","mp4","webm","m4v","mpeg4"]
 
 # Read in input/output locations from command-line
 # Args:
@@ -34,6 +40,30 @@ def get_args():
 ##        parser.add_argument("w_settings", default="whisper_args.txt",
 ##                            help="Text file containing settings for WhisperX",
 ##                            type=str)
+        parser.add_argument("--rss_watermark", default=None,
+                            help="RSS in MB above which to free memory between files",
+                            type=float, required=False)
+        parser.add_argument("--gpu_watermark", default=None,
+                            help="Reserved GPU memory in MB above which to free memory between files",
+                            type=float, required=False)
+        parser.add_argument("--mem_log", default=None,
+                            help="CSV of per-file memory stats. Defaults to [outlist]_memory.csv",
+                            type=str, required=False)
+        parser.add_argument("--audio_cache", default=None,
+                            help="Local folder for cached decoded audio, reused across runs",
+                            type=str, required=False)
+        parser.add_argument("--audio_cache_mb", default=default_cache_mb,
+                            help="Maximum size of the decoded audio cache in MB",
+                            type=float, required=False)
+        parser.add_argument("--align", action="store_true",
+                            help="Add word-level timing to VTTs on a background CPU pool")
+        parser.add_argument("--align_workers", default=2,
+                            help="Number of CPU worker processes for word alignment",
+                            type=int, required=False)
+        parser.add_argument("--align_threads", default=2,
+                            help="Torch threads per word alignment worker",
+                            type=int, required=False)
+        add_profile_args(parser)
         args = parser.parse_args()
         return args
 
@@ -141,6 +171,22 @@ def main():
     print("Device: ", model.device)
     print("Set up model")
 
+    mem = MemoryWatermark(log_path=args.mem_log or sidecar_log_path(args.outlist, "_memory.csv"),
+        rss_watermark=args.rss_watermark, gpu_watermark=args.gpu_watermark,
+        device=device)
+
+    audio_cache = None
+    if args.audio_cache:
+        audio_cache = AudioCache(args.audio_cache, args.audio_cache_mb)
+        print("Using decoded audio cache at: ", args.audio_cache)
+
+    profiler = RowProfiler.from_args(args, args.outlist)
+
+    align_stage = None
+    if args.align:
+        align_stage = AlignStage(args.align_workers, args.align_threads)
+        print("Word alignment on ", args.align_workers, " CPU workers")
+
 
     ### BATCH-PROCESS LOOP ########################################################
     with open(args.inlist, newline='') as inlist_obj:
@@ -154,7 +200,7 @@ def main():
             print("Found ", n_col, " columns. Expected 3. Exiting")
             inlist_obj.close()
             exit()
-        n_rows = sum(1 for row in inlist_obj)
+        n_rows = sum(1 for row in inlist_obj) - 1     # minus header
         inlist_obj.seek(0); next(in_reader)
 
 
@@ -167,6 +213,8 @@ def main():
             for row in in_reader:
                 t_start = time.perf_counter()
                 i+= 1
+                if profiler is not None:
+                    profiler.start_row(i, row[1])
                 # Read from current row in inlist
                 av_fpath, av_fname = row[0], row[1]
 
@@ -218,8 +266,12 @@ def main():
                     continue
 
                 # Attempt transcription, write results to VTT file
+                mem.start_file()
                 try:
-                    audio = whisperx.load_audio(av_fpath)
+                    if audio_cache is not None:
+                        audio = audio_cache.load(av_fpath, whisperx.load_audio)
+                    else:
+                        audio = whisperx.load_audio(av_fpath)
                     result = model.transcribe(
                         audio, 
                         batch_size=batch_size,
@@ -229,6 +281,7 @@ def main():
 
                     # Check duplicate results here
                     if result == prev_result:
+                        mem.end_file(av_fname)
                         err_msg = "Duplicate VTT of " + prev_file
                         update_log(csv_writer=out_writer, fpath=out_fpath,
                             fname=av_fname, msg=err_msg, 
@@ -248,6 +301,13 @@ def main():
                                 "max_line_width": None   
                             })
                         print("Wrote to VTT: ", out_fname)
+
+                        # Align in the background while ASR moves on
+                        if align_stage is not None:
+                            audio_src = getattr(audio, "filename", None)
+                            align_stage.submit(result["segments"],
+                                result["language"], av_fpath, out_fpath,
+                                audio_src)
                     except:
                         print("Unable to write to VTT: ", out_fname)
                 except:
@@ -258,11 +318,16 @@ def main():
                     msg="Transcription successful",
                     t_start=t_start, end_state=result_state.SUCCESS.name)
 
-                #delete model if low on GPU resources
-                gc.collect(); torch.cuda.empty_cache()
+                # Free memory only if above watermark
+                mem.end_file(av_fname)
 
                 print("\n")
 
+    if profiler is not None:
+        profiler.close()
+    if align_stage is not None:
+        align_stage.close()
+    mem.close()
     print("Transcript file locations written to: " + args.outlist)
 
 if __name__=="__main__":
@@ -0,0 +1,131 @@
+#!/usr/bin/python
+
+# Two-tier model cascade for the batch ASR scripts.
+#
+# Transcribes each file with a fast model first and scores the result from
+# its segment statistics (see quality_index.score_segments). Only files that
+# score below the confidence threshold, or that are mostly no-speech, are
+# re-transcribed with the large model. Both passes are logged to
+# [outlist]_cascade.csv so throughput and quality can be compared.
+
+from datetime import datetime
+
+import time
+
+from quality_index import score_segments
+from csv_log import open_csv_log
+
+default_threshold = 0.6
+default_max_no_speech = 0.5
+
+cascade_log_header = ["Filename", "Completion Time", "Fast Model",
+                      "Fast Seconds", "Fast Score", "Fast No Speech Ratio",
+                      "Escalated", "Reason", "Final Model", "Final Seconds",
+                      "Final Score"]
+
+
+def add_cascade_args(parser):
+    parser.add_argument("--cascade_model", default=None,
+                        help="Fast model to transcribe with first, e.g. small or turbo",
+                        type=str, required=False)
+    parser.add_argument("--cascade_threshold", default=default_threshold,
+                        help="Quality score below which a file is re-run on the large model",
+                        type=float, required=False)
+    parser.add_argument("--cascade_no_speech", default=default_max_no_speech,
+                        help="Share of no-speech audio above which a file is re-run on the large model",
+                        type=float, required=False)
+    parser.add_argument("--cascade_log", default=None,
+                        help="CSV of per-file cascade results. Defaults to [outlist]_cascade.csv",
+                        type=str, required=False)
+
+
+# Returns why a fast-model result should be escalated, or "" to keep it
+def escalation_reason(quality, threshold=default_threshold,
+                      max_no_speech=default_max_no_speech):
+    if quality["n_segments"] == 0:
+        return "no segments"
+    if quality["score"] < threshold:
+        return "low score"
+    if quality["no_speech_ratio"] > max_no_speech:
+        return "no speech"
+    return ""
+
+
+class ModelCascade(object):
+    ''' Runs a fast model first and escalates low-confidence files
+
+    : param fast_model   : Whisper model for the first pass
+    : param fast_name    : String, name of the fast model
+    : param large_name   : String, name of the large model
+    : param threshold    : Float, quality score below which to escalate
+    : param max_no_speech: Float, no-speech ratio above which to escalate
+    : param log_path     : String, CSV path for per-file cascade results, or None
+    '''
+    def __init__(self, fast_model, fast_name, large_name,
+                 threshold=default_threshold,
+                 max_no_speech=default_max_no_speech, log_path=None):
+        self._fast_model = fast_model
+        self._fast_name = fast_name
+        self._large_name = large_name
+        self._threshold = threshold
+        self._max_no_speech = max_no_speech
+        self.n_files, self.n_escalated = 0, 0
+        self.fast_seconds, self.large_seconds = 0.0, 0.0
+
+        self._log_obj, self._log_writer = None, None
+        if log_path:
+            self._log_obj, self._log_writer = open_csv_log(log_path, cascade_log_header)
+
+    # Transcribe with transcribe_fn(model, model name, audio), escalating to
+    # large_model when needed. Returns (result, cascade info for the stats sidecar).
+    def transcribe(self, fname, audio, large_model, transcribe_fn):
+        t_start = time.perf_counter()
+        result = transcribe_fn(self._fast_model, self._fast_name, audio)
+        fast_seconds = time.perf_counter() - t_start
+        fast_quality = score_segments(result["segments"])
+        reason = escalation_reason(fast_quality, self._threshold,
+                                   self._max_no_speech)
+        info = {"fast_model": self._fast_name,
+                "fast_seconds": round(fast_seconds, 3),
+                "fast_score": round(fast_quality["score"], 4),
+                "fast_no_speech_ratio": round(fast_quality["no_speech_ratio"], 4),
+                "escalated": bool(reason), "reason": reason,
+                "model": self._fast_name, "seconds": 0.0,
+                "score": round(fast_quality["score"], 4)}
+        self.n_files += 1
+        self.fast_seconds += fast_seconds
+
+        if reason:
+            print(f"Fast model score {info['fast_score']} ({reason}), "
+                  f"re-running on {self._large_name}")
+            t_start = time.perf_counter()
+            result = transcribe_fn(large_model, self._large_name, audio)
+            info["seconds"] = round(time.perf_counter() - t_start, 3)
+            info["model"] = self._large_name
+            info["score"] = round(score_segments(result["segments"])["score"], 4)
+            self.n_escalated += 1
+            self.large_seconds += info["seconds"]
+        else:
+            print(f"Kept fast model transcript, score {info['fast_score']}")
+
+        if self._log_writer is not None:
+            try:
+                self._log_writer.writerow([fname,
+                    datetime.now().strftime("%Y/%m/%d %H:%M:%S"),
+                    info["fast_model"], info["fast_seconds"], info["fast_score"],
+                    info["fast_no_speech_ratio"], info["escalated"],
+                    info["reason"], info["model"], info["seconds"],
+                    info["score"]])
+                self._log_obj.flush()
+            except (OSError, ValueError):
+                print("Unable to write to cascade log")
+        return result, info
+
+    def close(self):
+        if self.n_files:
+            print(f"Cascade: escalated {self.n_escalated} of {self.n_files} files, "
+                  f"{round(self.fast_seconds, 1)} s fast model, "
+                  f"{round(self.large_seconds, 1)} s large model")
+        if self._log_obj is not None:
+            self._log_obj.close()
+            self._log_obj, self._log_writer = None, None
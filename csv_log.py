@@ -0,0 +1,23 @@
+#!/usr/bin/python
+
+# Shared helpers for the per-run CSV sidecar logs (memory, fallback,
+# cascade and profile logs) written next to a batch script's outlist.
+
+import os, csv
+
+
+# Sidecar path next to the outlist: "<outlist stem><suffix>",
+# e.g. sidecar_log_path("02_outlist.csv", "_memory.csv")
+def sidecar_log_path(outlist, suffix):
+    return os.path.splitext(outlist)[0] + suffix
+
+
+# Open a CSV log in append mode, writing the header if the file is new
+# Returns (file object, csv writer)
+def open_csv_log(path, header):
+    new_log = not os.path.exists(path)
+    log_obj = open(path, "a", newline='')
+    log_writer = csv.writer(log_obj, delimiter=',')
+    if new_log:
+        log_writer.writerow(header)
+    return log_obj, log_writer
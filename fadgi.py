@@ -0,0 +1,205 @@
+#!/usr/bin/python
+
+# FADGI metadata for CA-R WebVTT transcripts.
+#
+# Builds, validates and embeds the metadata block recommended by FADGI's
+# 'Guidelines for Embedding Metadata in WebVTT Files', and reads it back
+# from existing VTTs. Shared by batchWhisper.py, pipeline.py and
+# fadgi_restamp.py without loading any ASR model.
+
+import os, re
+
+from iso3166_2 import *
+
+# Constants for embedding metadata
+fadgi_types = ["subtitle", "caption", "audio description",   # Vocab values for FADGI type
+                "chapters", "metadata"]  
+fadgi_party1 = "US, California Revealed"                     # Required value for FADGI Responsible Party
+fadgi_fileCreator = "OpenAI Whisper"                         # Required value for WebVTT creator
+
+iso = ISO3166_2()
+
+# Fields a re-stamp keeps from the existing block. They record how and when
+# the transcript was made, not the intake record.
+preserved_fields = {"Language": "lang",
+                    "File Creator": "f_creator",
+                    "File Creation Date": "fc_date"}
+
+
+def reset_mdata(mdata):
+    mdata = {
+        "type": fadgi_types[1],
+        "lang": "",
+        "party1": fadgi_party1,
+        "party2": "",
+        "mi": "",
+        "mi_type": "",
+        "og_file": "",
+        "f_creator": fadgi_fileCreator,
+        "fc_date": "",
+        "title": "",
+        "og_history": "",
+        "local_key1": "",
+        "local_value1": "",
+        "local_key2": "",
+        "local_value2": ""
+    }
+    return mdata
+
+def validate_mdata(mdata):
+    # Is Type compliant with FADGI type vocab?
+    if not mdata["type"] in fadgi_types:
+        return "Provided WebVTT type does not comply with FADGI vocabulary"
+
+    # Do party fields have [Country], [Name] structure?
+    try:
+        p1_tokens = mdata["party1"].split(',')
+        p1_country, p1_name = p1_tokens[0], p1_tokens[1]
+    except:
+        return "Responsible Party 1 does not follow [Country], [Partner Name] formatting"
+    try:
+        p2_tokens = mdata["party2"].split(',')
+        p2_country, p2_name = p2_tokens[0], p2_tokens[1]
+    except:
+        return "Responsible Party 2 does not follow [Country], [Partner Name] formatting"
+
+    # Do party fields have ISO-compliant country codes?    
+    try: iso[p1_country]
+    except:
+        return "Country code for Responsible Party 1 does not comply with ISO 3166-2"
+
+    try: iso[p2_country]
+    except:
+        return "Country code for Responsible Party 2 does not comply with ISO 3166-2"
+
+    # Does media identifier follow CA-R object_identifier format?
+    mi_tokens = mdata["mi"].split('_')
+    if len(mi_tokens) != 2:
+        return "Object Identifier does not have correct number of underscores"
+    try:
+        obj_number = int(mi_tokens[1])
+    except:
+        return "Object Identifier does not contain a number in expected position"
+
+    # Does MI Type is local?
+    if mdata["mi_type"] != "local":
+        return "Media Identifier Type for CA-R object identifier is not local"
+
+    # Are both key and value present for local pairs?
+    keys = (k for k in mdata.keys() if 'local_key' in k)
+    values = (v for v in mdata.keys() if 'local_value' in v)
+    for k, v in zip(keys, values):
+        if bool(mdata[k]) != bool(mdata[v]):
+            return "Key and Value Fields must be used together if using Local Usage Elements"
+    return ""
+
+# Adds strongly-recommended metadata to WebVTT file header,
+# following FADGI recommendations outined in 
+# 'Guidelines for Embedding Metadata in WebVTT Files'
+# June 7, 2024 version
+#
+# Returns the metadata block written after the WEBVTT line
+def fadgi_block(mdata):
+    # Comments show example output for WebVTT embedded metadata
+    # [brackets] indicate values from corresponding field names in AV Data Baseline reports
+    block = "\n" + "Type: " + mdata["type"] + "\n"                # Type: caption
+    block += "Language: " + mdata["lang"] + "\n"                   # Type: language specified or detected during transcription 
+    block += ("Responsible Party: " + mdata["party1"]
+        + "; " +  mdata["party2"] + "\n")                          # Responsible party: US, California Revealed; US, [Partner Name]
+    block += ("Media Identifier: " + mdata["mi"]
+        + ", " + mdata["mi_type"] + "\n")                          # Media Identifier: [obj_object_identifier], local
+    block += ("Originating File: "
+        + mdata["og_file"] + "\n")                                 # Originating File: [obj_object_identifier]_t1_access.mp3
+    block += ("File Creator: "
+        + mdata["f_creator"] + "\n")                               # File Creator: OpenAI Whisper         
+    block += ("File Creation Date: "
+        + mdata["fc_date"] + "\n")                                 # File Creation Date: 2025-06-27
+    block += "Title: " + mdata["title"] + "\n"                     # Title: [label]                       
+    block += ("Origin History: "
+        + mdata["og_history"] + "\n")                              # Origin History: Created in response to 2024 website accessibility audit
+
+    if (mdata["local_key1"] != "" and mdata["local_value1"] != ""):
+        block += mdata["local_key1"] + ": " + mdata["local_value1"] + "\n"
+
+    if (mdata["local_key2"] != "" and mdata["local_value2"] != ""):
+        block += mdata["local_key2"] + ": " + mdata["local_value2"] + "\n"
+    return block
+
+# Embeds the FADGI metadata block after the WEBVTT line of a new VTT
+#
+# Needs: filepath of VTT, use to create file object
+def write_fadgi_block(fpath, mdata):
+    # Validate provided filepath for webVTT metadata embedding
+    if not fpath:
+        print("write_fadgi_block: Empty filepath")
+        return False
+    elif not os.path.exists(fpath):
+        print("write_fadgi_block: Filepath does not exist for: ", fpath)
+        return False
+    elif fpath.split(".")[-1] != "vtt":
+        print("write_fadgi_block: Expected VTT file")
+        return False
+
+    with open(fpath, "r") as f_reader:
+        lines = f_reader.readlines()
+
+    with open(fpath, "w") as f_writer:
+        f_writer.write(lines[0])
+        lines.pop(0)
+        f_writer.write(fadgi_block(mdata))
+        for l in lines:
+            f_writer.write(l)
+
+    return True
+
+
+# Parse FADGI metadata values from an intake sheet row into mdata
+def parse_row_mdata(row, mdata):
+    mdata["party2"] = row[3]
+    mdata["mi"] = row[4]
+    mdata["mi_type"] = row[5]
+    mdata["og_file"] = row[1]
+    mdata["title"] = row[6]
+    mdata["og_history"] = row[7]
+    mdata["local_key1"] = row[8]
+    mdata["local_value1"] = row[9]
+    mdata["local_key2"] = row[10]
+    mdata["local_value2"] = row[11]
+    return mdata
+
+
+# Split a VTT header (see vtt_utils.parse_vtt) into blocks and blank-line
+# separators. Returns (parts, index of the FADGI block in parts or None).
+def _header_parts(header):
+    parts = re.split(r"(\n\s*\n)", header)
+    for i in range(2, len(parts), 2):
+        if parts[i].lstrip("\n").startswith("Type: "):
+            return parts, i
+    return parts, None
+
+
+# Read the "Field: value" lines of the FADGI block in a VTT header
+def read_fadgi_fields(header):
+    parts, i = _header_parts(header)
+    fields = {}
+    if i is None:
+        return fields
+    for line in parts[i].strip("\n").split("\n"):
+        key, sep, value = line.partition(": ")
+        if sep:
+            fields[key] = value
+    return fields
+
+
+# Replace the FADGI block of a VTT header with one built from mdata, or add
+# one after the WEBVTT line. The rest of the header is left unchanged.
+def replace_fadgi_block(header, mdata):
+    parts, i = _header_parts(header)
+    block = fadgi_block(mdata).strip("\n")
+    if i is not None:
+        parts[i] = block
+    elif len(parts) == 1:
+        parts = [parts[0].rstrip("\n"), "\n\n", block, "\n\n"]
+    else:
+        parts[2:2] = [block, "\n\n"]
+    return "".join(parts)
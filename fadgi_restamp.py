@@ -0,0 +1,154 @@
+#!/usr/bin/python
+
+# Bulk FADGI re-stamping of existing VTTs, without re-transcription.
+#
+# For each inlist row, rebuilds the FADGI metadata block of the matching
+# VTT in [vtt_dir] from the current intake values (Partner Name, Title,
+# Origin History, local fields...) and the current write_fadgi_block()
+# layout. Every row is checked with validate_mdata first. Language, File
+# Creator and File Creation Date are kept from the existing block, since
+# they describe the transcription rather than the intake record. Only the
+# header is rewritten, atomically; every cue stays byte-identical. Rows are
+# spread over a process pool and no ASR model is loaded.
+#
+# Usage: python fadgi_restamp.py [02 inlist] [vtt_dir] [restamp log CSV]
+
+from datetime import datetime
+
+import os, csv, time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from fadgi import reset_mdata, validate_mdata, parse_row_mdata
+from fadgi import read_fadgi_fields, replace_fadgi_block, preserved_fields
+from vtt_utils import read_vtt, write_vtt
+
+restamp_log_header = ["Filepath", "Filename", "Elapsed Time", "Message",
+                      "Completion Time", "State"]
+n_inlist_cols = 12
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("inlist", help="Local filepath to input CSV (02 inlist format)",
+                        type=str)
+    parser.add_argument("vtt_dir", help="Local folder of existing VTT transcripts",
+                        type=str)
+    parser.add_argument("outlist", help="Local filepath to re-stamp results CSV",
+                        type=str)
+    parser.add_argument("--workers", default=os.cpu_count(),
+                        help="Number of worker processes", type=int)
+    parser.add_argument("--chunksize", default=64,
+                        help="Rows handed to a worker at a time", type=int)
+    parser.add_argument("--dry_run", action="store_true",
+                        help="Validate rows and report changes without writing VTTs")
+    args = parser.parse_args()
+    return args
+
+
+# Re-stamp one VTT from its inlist row.
+# Returns (VTT path, VTT name, elapsed time, message, state).
+def restamp_vtt(job):
+    vtt_fpath, row, dry_run = job
+    t_start = time.perf_counter()
+    vtt_fname = os.path.basename(vtt_fpath)
+
+    def done(msg, state):
+        return (vtt_fpath, vtt_fname, time.perf_counter() - t_start, msg, state)
+
+    if len(row) < n_inlist_cols:
+        return done("Inlist row has too few columns", "ERROR")
+    if not os.path.exists(vtt_fpath):
+        return done("VTT not found. Skipping file.", "ERROR")
+
+    try:
+        header, cues = read_vtt(vtt_fpath)
+    except (OSError, UnicodeDecodeError):
+        return done("Unable to read VTT", "ERROR")
+    if not header.startswith("WEBVTT"):
+        return done("Not a WebVTT file", "ERROR")
+
+    mdata = parse_row_mdata(row, reset_mdata({}))
+    fields = read_fadgi_fields(header)
+    for field, key in preserved_fields.items():
+        if fields.get(field):
+            mdata[key] = fields[field]
+    if not mdata["lang"]:
+        return done("No Language in existing VTT header", "ERROR")
+    if not mdata["fc_date"]:
+        # No block yet: date the transcript by when the VTT was written
+        mdata["fc_date"] = datetime.fromtimestamp(
+            os.path.getmtime(vtt_fpath)).strftime('%Y-%m-%d')
+
+    mdata_check = validate_mdata(mdata)
+    if mdata_check:
+        return done(mdata_check, "ERROR")
+
+    new_header = replace_fadgi_block(header, mdata)
+    if new_header == header:
+        return done("FADGI metadata unchanged", "SUCCESS")
+    if dry_run:
+        return done("FADGI metadata would be re-stamped", "SUCCESS")
+    try:
+        write_vtt(vtt_fpath, new_header, cues)
+    except OSError:
+        return done("Failed to write VTT", "ERROR")
+    return done("Re-stamped FADGI metadata", "SUCCESS")
+
+
+# One job per VTT; later rows for the same VTT are skipped so two workers
+# never write the same file
+def read_jobs(inlist, vtt_dir, dry_run):
+    jobs, seen = [], set()
+    with open(inlist, newline='') as inlist_obj:
+        in_reader = csv.reader(inlist_obj, delimiter=',')
+        next(in_reader)
+        for row in in_reader:
+            if len(row) < 2:
+                continue
+            vtt_fpath = os.path.join(vtt_dir, os.path.splitext(row[1])[0] + ".vtt")
+            if vtt_fpath in seen:
+                print("Skipping duplicate inlist row for: ", row[1])
+                continue
+            seen.add(vtt_fpath)
+            jobs.append((vtt_fpath, row, dry_run))
+    return jobs
+
+
+def main():
+    args = get_args()
+    if not os.path.exists(args.inlist):
+        print("Filepath for inlist not found: ", args.inlist)
+        print("Exiting")
+        exit()
+    if not os.path.isdir(args.vtt_dir):
+        print("VTT folder not found: ", args.vtt_dir)
+        print("Exiting")
+        exit()
+
+    t_run = time.perf_counter()
+    jobs = read_jobs(args.inlist, args.vtt_dir, args.dry_run)
+    print(f"Re-stamping {len(jobs)} VTTs with {args.workers} workers")
+
+    counts = {}
+    new_log = not os.path.exists(args.outlist)
+    with open(args.outlist, "a", newline='') as outlist_obj, \
+            ProcessPoolExecutor(max_workers=args.workers) as pool:
+        out_writer = csv.writer(outlist_obj, delimiter=',')
+        if new_log:
+            out_writer.writerow(restamp_log_header)
+        for vtt_fpath, vtt_fname, elapsed, msg, state in pool.map(
+                restamp_vtt, jobs, chunksize=args.chunksize):
+            if state == "ERROR":
+                print(vtt_fname, ": ", msg)
+            counts[msg] = counts.get(msg, 0) + 1
+            out_writer.writerow([vtt_fpath, vtt_fname, elapsed, msg,
+                datetime.now().strftime("%Y/%m/%d %H:%M:%S"), state])
+
+    for msg, n in sorted(counts.items(), key=lambda c: -c[1]):
+        print(f"{n:>8}  {msg}")
+    print("Finished in ", time.perf_counter() - t_run, " seconds")
+    print("Re-stamp results written to: " + args.outlist)
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/python
+
+# Temperature-fallback telemetry and budget for Whisper transcription.
+#
+# Whisper decodes each 30-second window at the first temperature of the
+# ladder and re-decodes it at the next temperature whenever the output looks
+# repetitive or low-confidence, up to once per ladder step. FallbackMonitor
+# wraps model.decode to count those re-decodes per window and per file, and
+# the wall time they take. Once a file, or the whole run, has spent its
+# fallback time budget, further re-decodes are skipped: the window keeps its
+# last decode, which is what Whisper does when the ladder runs out.
+#
+# One inlist is normally one collection, so the run budget caps fallback
+# time per collection.
+
+from datetime import datetime
+
+import time
+
+from csv_log import open_csv_log, sidecar_log_path
+
+fallback_log_header = ["Filename", "Completion Time", "Model", "Windows",
+                       "Fallback Windows", "Re-decodes", "Skipped Re-decodes",
+                       "Decode Seconds", "Fallback Seconds", "Budget Hit"]
+
+
+def add_fallback_args(parser):
+    parser.add_argument("--fallback_budget", default=None,
+                        help="Seconds of temperature-fallback re-decoding allowed per file",
+                        type=float, required=False)
+    parser.add_argument("--fallback_run_budget", default=None,
+                        help="Seconds of temperature-fallback re-decoding allowed for the whole run",
+                        type=float, required=False)
+    parser.add_argument("--fallback_cap", default=0,
+                        help="Re-decodes still allowed per window once a budget is spent",
+                        type=int, required=False)
+    parser.add_argument("--fallback_log", default=None,
+                        help="CSV of per-file fallback stats. Defaults to [outlist]_fallback.csv",
+                        type=str, required=False)
+
+
+class FallbackMonitor(object):
+    ''' Counts and budgets temperature-fallback re-decodes of Whisper models
+
+    : param models      : List of (Whisper model, String name) to track, e.g.
+                          both tiers of a model cascade
+    : param temperatures: Sequence of Floats, the temperature ladder passed
+                          to transcribe
+    : param file_budget : Number, fallback seconds allowed per file, or None
+    : param run_budget  : Number, fallback seconds allowed per run, or None
+    : param cap         : Int, re-decodes per window allowed once over budget
+    : param log_path    : String, CSV path for per-file fallback stats, or None
+    '''
+    def __init__(self, models, temperatures, file_budget=None, run_budget=None,
+                 cap=0, log_path=None):
+        if isinstance(temperatures, (int, float)):
+            temperatures = [temperatures]
+        self._first_t = temperatures[0]
+        self._file_budget = file_budget
+        self._run_budget = run_budget
+        self._cap = cap
+        self.run_fallback_seconds = 0.0
+
+        # transcribe() looks up model.decode on each attempt, so an instance
+        # attribute sees every temperature of every window
+        self._models = []
+        for model, name in models:
+            self._models.append((model, model.decode))
+            model.decode = self._tracker(model.decode, name)
+        self._names = [name for model, name in models]
+        self.start_file()
+
+        self._log_obj, self._log_writer = None, None
+        if log_path:
+            self._log_obj, self._log_writer = open_csv_log(log_path, fallback_log_header)
+
+    @classmethod
+    def from_args(cls, args, models, temperatures, outlist):
+        return cls(models, temperatures, args.fallback_budget,
+                   args.fallback_run_budget, args.fallback_cap,
+                   args.fallback_log or sidecar_log_path(outlist, "_fallback.csv"))
+
+    # Budgets cover all models: a file's fallback time on the fast tier
+    # counts against the same budget as on the large tier
+    def over_budget(self):
+        file_seconds = sum(t["fallback_seconds"] for t in self._file.values())
+        if self._file_budget is not None and file_seconds >= self._file_budget:
+            return True
+        if (self._run_budget is not None
+                and self.run_fallback_seconds >= self._run_budget):
+            return True
+        return False
+
+    def _tracker(self, decode, name):
+        def tracked_decode(mel, options):
+            return self._tracked_decode(decode, self._file[name], mel, options)
+        return tracked_decode
+
+    def _tracked_decode(self, decode, f, mel, options):
+        if options.temperature == self._first_t or f["window"] is None:
+            # First attempt at a new window. Drop the previous window's
+            # result, which holds on to its audio features.
+            if f["window"] is not None:
+                f["window"].pop("last", None)
+            f["window"] = {"window": f["n_windows"], "attempts": 0,
+                           "fallback_seconds": 0.0, "skipped": 0}
+            f["n_windows"] += 1
+        window = f["window"]
+
+        # Over budget: return the window's last decode instead of re-decoding.
+        # Whisper keeps trying the rest of the ladder, so each skip is cheap.
+        if (window["attempts"] > self._cap and self.over_budget()
+                and window.get("last") is not None):
+            window["skipped"] += 1
+            f["skipped"] += 1
+            f["budget_hit"] = True
+            return window["last"]
+
+        t_start = time.perf_counter()
+        result = decode(mel, options)
+        elapsed = time.perf_counter() - t_start
+        f["decode_seconds"] += elapsed
+        if window["attempts"] > 0:
+            window["fallback_seconds"] += elapsed
+            f["fallback_seconds"] += elapsed
+            self.run_fallback_seconds += elapsed
+            f["redecodes"] += 1
+            if window["attempts"] == 1:
+                f["windows"].append(window)
+            if self.over_budget():
+                f["budget_hit"] = True
+        window["attempts"] += 1
+        window["last"] = result
+        return result
+
+    # Call before transcribing a file
+    def start_file(self):
+        self._file = {name: {"n_windows": 0, "window": None, "windows": [],
+                             "redecodes": 0, "skipped": 0, "decode_seconds": 0.0,
+                             "fallback_seconds": 0.0, "budget_hit": False}
+                      for name in self._names}
+
+    def _tier_stats(self, f):
+        if f["window"] is not None:
+            f["window"].pop("last", None)
+        return {"windows": f["n_windows"], "redecodes": f["redecodes"],
+                "skipped_redecodes": f["skipped"],
+                "decode_seconds": round(f["decode_seconds"], 3),
+                "fallback_seconds": round(f["fallback_seconds"], 3),
+                "budget_hit": f["budget_hit"],
+                # Only windows that needed at least one fallback
+                "fallback_windows": [{"window": w["window"],
+                    "redecodes": w["attempts"] - 1, "skipped": w["skipped"],
+                    "fallback_seconds": round(w["fallback_seconds"], 3)}
+                    for w in f["windows"]]}
+
+    # Per-file fallback telemetry for the segment statistics sidecar:
+    # totals over all models, plus per-model counts under "models"
+    def file_stats(self):
+        tiers = {name: self._tier_stats(self._file[name]) for name in self._names}
+        stats = {"windows": 0, "redecodes": 0, "skipped_redecodes": 0,
+                 "decode_seconds": 0.0, "fallback_seconds": 0.0,
+                 "budget_hit": False}
+        for t in tiers.values():
+            for key in ("windows", "redecodes", "skipped_redecodes"):
+                stats[key] += t[key]
+            for key in ("decode_seconds", "fallback_seconds"):
+                stats[key] = round(stats[key] + t[key], 3)
+            stats["budget_hit"] = stats["budget_hit"] or t["budget_hit"]
+        stats["models"] = tiers
+        return stats
+
+    # Call after transcribing a file. Logs and returns its fallback stats.
+    def end_file(self, fname):
+        stats = self.file_stats()
+        for name, t in stats["models"].items():
+            if t["redecodes"]:
+                print(f"Temperature fallback ({name}): {t['redecodes']} re-decodes in "
+                      f"{len(t['fallback_windows'])} of {t['windows']} windows, "
+                      f"{t['fallback_seconds']} seconds")
+        if stats["budget_hit"]:
+            print(f"Fallback budget spent, skipped {stats['skipped_redecodes']} re-decodes")
+
+        if self._log_writer is not None:
+            try:
+                # One row per model that decoded this file
+                for name, t in stats["models"].items():
+                    if not t["windows"]:
+                        continue
+                    self._log_writer.writerow([fname,
+                        datetime.now().strftime("%Y/%m/%d %H:%M:%S"), name,
+                        t["windows"], len(t["fallback_windows"]),
+                        t["redecodes"], t["skipped_redecodes"],
+                        t["decode_seconds"], t["fallback_seconds"],
+                        t["budget_hit"]])
+                self._log_obj.flush()
+            except (OSError, ValueError):
+                print("Unable to write to fallback log")
+        return stats
+
+    # Restore the models' own decode and close the log
+    def close(self):
+        for model, decode in self._models:
+            model.decode = decode
+        if self._log_obj is not None:
+            self._log_obj.close()
+            self._log_obj, self._log_writer = None, None
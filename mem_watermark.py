@@ -0,0 +1,177 @@
+#!/usr/bin/python
+
+# Memory watermark manager for the batch ASR scripts.
+#
+# Tracks current and peak RSS (and CUDA memory when a device is present)
+# for each transcribed file. Only runs gc.collect() / torch.cuda.empty_cache()
+# once usage crosses a configurable watermark, instead of after every file,
+# so short-clip batches keep the allocator caches warm between files.
+
+from datetime import datetime
+
+import sys, os, gc
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+from csv_log import open_csv_log
+
+MB = 1024 * 1024
+
+# Default watermarks, as fractions of total system RAM / device memory
+default_rss_fraction = 0.75
+default_gpu_fraction = 0.90
+
+mem_log_header = ["Filename", "Completion Time", "RSS MB", "Peak RSS MB",
+                  "GPU Allocated MB", "GPU Peak MB", "GPU Reserved MB",
+                  "Cleanup"]
+
+
+# Read a "VmXXX:   1234 kB" field from /proc/self/status, in bytes
+def _proc_status_bytes(field):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def total_ram_bytes():
+    if psutil is not None:
+        return psutil.virtual_memory().total
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def current_rss_bytes():
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    return _proc_status_bytes("VmRSS")
+
+
+def peak_rss_bytes():
+    peak = _proc_status_bytes("VmHWM")
+    if peak is not None:
+        return peak
+    try:
+        import resource
+        # ru_maxrss is bytes on macOS, KB on Linux and the BSDs
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return None
+
+
+# Reset the kernel's peak RSS counter so each file gets its own peak.
+# Only supported on Linux >= 4.0; silently ignored elsewhere.
+def reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+class MemoryWatermark(object):
+    ''' Per-file memory tracker with watermark-triggered cleanup
+
+    : param log_path     : String, CSV path for per-file memory stats, or None
+    : param rss_watermark: Number, RSS in MB above which to run cleanup.
+                           Defaults to 75% of system RAM
+    : param gpu_watermark: Number, reserved device memory in MB above which to
+                           run cleanup. Defaults to 90% of device memory
+    : param device       : String, torch device the model runs on
+    '''
+    def __init__(self, log_path=None, rss_watermark=None,
+                 gpu_watermark=None, device="cpu"):
+        self._device = str(device)
+        self._use_cuda = (torch is not None and self._device.startswith("cuda")
+                          and torch.cuda.is_available())
+
+        if rss_watermark is None:
+            total = total_ram_bytes()
+            self._rss_mark = total * default_rss_fraction if total else None
+        else:
+            self._rss_mark = rss_watermark * MB
+
+        self._gpu_mark = None
+        if self._use_cuda:
+            if gpu_watermark is None:
+                total = torch.cuda.get_device_properties(self._device).total_memory
+                self._gpu_mark = total * default_gpu_fraction
+            else:
+                self._gpu_mark = gpu_watermark * MB
+
+        self.n_cleanups = 0
+        self._log_obj, self._log_writer = None, None
+        if log_path:
+            self._log_obj, self._log_writer = open_csv_log(log_path, mem_log_header)
+
+    # Call before starting work on a file
+    def start_file(self):
+        reset_peak_rss()
+        if self._use_cuda:
+            torch.cuda.reset_peak_memory_stats(self._device)
+
+    def stats(self):
+        stats = {"rss": current_rss_bytes(), "peak_rss": peak_rss_bytes(),
+                 "gpu_alloc": None, "gpu_peak": None, "gpu_reserved": None}
+        if self._use_cuda:
+            stats["gpu_alloc"] = torch.cuda.memory_allocated(self._device)
+            stats["gpu_peak"] = torch.cuda.max_memory_allocated(self._device)
+            stats["gpu_reserved"] = torch.cuda.memory_reserved(self._device)
+        return stats
+
+    def over_watermark(self, stats):
+        if (self._rss_mark is not None and stats["rss"] is not None
+                and stats["rss"] > self._rss_mark):
+            return True
+        if (self._gpu_mark is not None and stats["gpu_reserved"] is not None
+                and stats["gpu_reserved"] > self._gpu_mark):
+            return True
+        return False
+
+    def cleanup(self):
+        gc.collect()
+        if self._use_cuda:
+            torch.cuda.empty_cache()
+        self.n_cleanups += 1
+
+    # Call after finishing a file. Logs memory stats and cleans up only
+    # if usage is above a watermark. Returns True if cleanup ran.
+    def end_file(self, fname):
+        stats = self.stats()
+        cleaned = self.over_watermark(stats)
+        if cleaned:
+            print("Memory above watermark, running cleanup")
+            self.cleanup()
+
+        if self._log_writer is not None:
+            to_mb = lambda b: "" if b is None else round(b / MB, 1)
+            try:
+                self._log_writer.writerow([fname,
+                    datetime.now().strftime("%Y/%m/%d %H:%M:%S"),
+                    to_mb(stats["rss"]), to_mb(stats["peak_rss"]),
+                    to_mb(stats["gpu_alloc"]), to_mb(stats["gpu_peak"]),
+                    to_mb(stats["gpu_reserved"]), cleaned])
+                self._log_obj.flush()
+            except (OSError, ValueError):
+                print("Unable to write to memory log")
+        return cleaned
+
+    def close(self):
+        if self._log_obj is not None:
+            self._log_obj.close()
+            self._log_obj, self._log_writer = None, None
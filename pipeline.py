@@ -0,0 +1,360 @@
+#!/usr/bin/python
+
+# Pipelined orchestrator for the CA-R BatchASR workflow.
+#
+# Runs download -> transcribe -> embed -> upload as concurrent stages
+# connected by bounded queues, instead of three separate batch steps:
+#   - download: thread pool pulling source media from S3 into scratch
+#   - transcribe: one worker process holding the Whisper model
+#   - embed + upload: thread pool writing the VTT, embedding FADGI
+#     metadata, uploading to S3 and clearing scratch
+# Each object moves on as soon as its previous stage finishes. Full queues
+# block the stage feeding them, which bounds scratch disk use. If the
+# transcribe process dies, the other stages stop waiting on it and every
+# unfinished object is logged as an error.
+#
+# Input is a 02 inlist (Filepath, Filename, S3 URI, metadata...). Rows
+# whose Filepath already exists locally skip the download stage.
+# Writes a 02-format transcription log and a 03-format upload log.
+
+from datetime import datetime
+
+import os, csv, time, queue, threading
+import multiprocessing as mp
+import argparse
+
+import boto3, torch
+
+# Seconds between checks that the transcribe process is still alive
+poll_interval = 5
+
+import batchWhisper as bw
+from mem_watermark import MemoryWatermark
+from av_extract import is_video, extract_audio
+from s3_stream import split_s3_uri
+from s3_upload import upload_file
+from s3_upload import update_log as update_upload_log
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("inlist", help="Local filepath to input CSV (02 inlist format)",
+                        type=str)
+    parser.add_argument("scratch", help="Local folder for downloaded media",
+                        type=str)
+    parser.add_argument("outdir", help="Local folder for VTT transcripts",
+                        type=str)
+    parser.add_argument("outlist", help="Local filepath to transcription results CSV",
+                        type=str)
+    parser.add_argument("upload_log", help="Local filepath to upload results CSV",
+                        type=str)
+    parser.add_argument("--w_settings", default=None,
+                        help="Text file containing settings for Whisper",
+                        type=str, required=False)
+    parser.add_argument("--download_workers", default=4,
+                        help="Number of concurrent S3 downloads", type=int)
+    parser.add_argument("--upload_workers", default=4,
+                        help="Number of concurrent embed/upload workers", type=int)
+    parser.add_argument("--queue_size", default=4,
+                        help="Maximum files waiting between stages", type=int)
+    parser.add_argument("--endpoint_url", default=None,
+                        help="S3 endpoint URL, e.g. for a local S3-compatible server",
+                        type=str)
+    parser.add_argument("--extract_audio", action="store_true",
+                        help="Demux audio from downloaded videos before transcription")
+    parser.add_argument("--keep_media", action="store_true",
+                        help="Keep downloaded media in scratch after transcription")
+    parser.add_argument("--no_upload", action="store_true",
+                        help="Transcribe and embed only, skip the S3 upload stage")
+    args = parser.parse_args()
+    return args
+
+
+def locked_log(log_lock, log_obj, fn, *log_args, **log_kwargs):
+    with log_lock:
+        fn(*log_args, **log_kwargs)
+        log_obj.flush()
+
+
+# Put an item on a queue read by the transcribe process.
+# Returns False instead of blocking forever if that process has died.
+def put_alive(q, item, asr_proc):
+    while True:
+        try:
+            q.put(item, timeout=poll_interval)
+            return True
+        except queue.Full:
+            if not asr_proc.is_alive():
+                return False
+
+
+def asr_died_msg(asr_proc):
+    return f"Transcription process exited with code {asr_proc.exitcode}"
+
+
+### STAGE 1: DOWNLOAD ##########################################################
+def download_worker(dl_q, asr_q, asr_proc, pending, client, args, out_log,
+                    log_lock):
+    out_obj, out_writer = out_log
+    while True:
+        job = dl_q.get()
+        if job is None:
+            break
+
+        # Nothing left to transcribe with: don't fetch more media
+        if not asr_proc.is_alive():
+            locked_log(log_lock, out_obj, bw.update_log, out_writer,
+                job["av_fpath"], job["av_fname"], msg=asr_died_msg(asr_proc),
+                t_start=time.perf_counter(), end_state=bw.result_state.ERROR.name)
+            continue
+
+        if not os.path.exists(job["av_fpath"]):
+            bucket, key = split_s3_uri(job["s3_uri"])
+            local_fpath = os.path.join(args.scratch, job["av_fname"])
+            print("Downloading: ", job["s3_uri"])
+            try:
+                client.download_file(bucket, key, local_fpath)
+            except Exception as e:
+                print("Failed to download ", job["s3_uri"], e)
+                locked_log(log_lock, out_obj, bw.update_log, out_writer,
+                    job["av_fpath"], job["av_fname"], msg="Failed to download from S3",
+                    t_start=time.perf_counter(), end_state=bw.result_state.ERROR.name)
+                continue
+            job["av_fpath"], job["downloaded"] = local_fpath, True
+
+            if args.extract_audio and is_video(local_fpath):
+                audio_fpath = extract_audio(local_fpath, args.scratch)
+                if audio_fpath is not None:
+                    if not args.keep_media:
+                        os.remove(local_fpath)
+                    # av_fname stays the archived video's name for the log;
+                    # only the path points at the sidecar
+                    job["av_fpath"] = audio_fpath
+
+        # Blocks while the ASR stage is behind
+        with log_lock:
+            pending[job["out_fpath"]] = job
+        if not put_alive(asr_q, job, asr_proc):
+            with log_lock:
+                pending.pop(job["out_fpath"], None)
+            if job["downloaded"] and not args.keep_media \
+                    and os.path.exists(job["av_fpath"]):
+                os.remove(job["av_fpath"])
+            locked_log(log_lock, out_obj, bw.update_log, out_writer,
+                job["av_fpath"], job["av_fname"], msg=asr_died_msg(asr_proc),
+                t_start=time.perf_counter(), end_state=bw.result_state.ERROR.name)
+
+
+### STAGE 2: TRANSCRIBE ########################################################
+# Runs in its own process so the GIL and model memory stay out of the
+# I/O stages. Puts (job, result, error message) on done_q.
+def asr_worker(asr_q, done_q, w_settings_path, n_consumers):
+    w_settings = {}
+    if w_settings_path and os.path.exists(w_settings_path):
+        w_settings = bw.read_w_settings(w_settings_path)
+    decode_options = bw.get_decode_options(w_settings)
+    device = "cuda:0" if torch.cuda.is_available() else "cpu"
+    model, _ = bw.load_asr_model(w_settings, device)
+    mem = MemoryWatermark(device=model.device)
+
+    prev_text, prev_file = "", ""
+    while True:
+        job = asr_q.get()
+        if job is None:
+            break
+
+        t_start = time.perf_counter()
+        result = None
+        msg = bw.check_av_file(job["av_fpath"], job["av_fname"], job["out_fpath"])
+        if not msg:
+            print("Attempting Whisper transcription for: ", job["av_fname"])
+            mem.start_file()
+            try:
+                result = bw.run_transcribe(model, job["av_fpath"], w_settings,
+                    decode_options, device)
+            except Exception as e:
+                print("Transcription failed for: ", job["av_fname"], e)
+                msg = "Transcription failed"
+            mem.end_file(job["av_fname"])
+
+        if result is not None:
+            if result["text"] == "":
+                msg = "Blank transcript"
+            elif result["text"] == prev_text:
+                msg = "Duplicate VTT of " + prev_file
+            prev_text, prev_file = result["text"], job["av_fname"]
+
+        job["asr_elapsed"] = time.perf_counter() - t_start
+        done_q.put((job, result, msg))
+
+    for n in range(n_consumers):
+        done_q.put(None)
+
+
+### STAGE 3: EMBED + UPLOAD ####################################################
+def deliver_worker(done_q, asr_proc, pending, client, args, out_log, up_log,
+                   log_lock, first_vtt):
+    out_obj, out_writer = out_log
+    up_obj, up_writer = up_log
+    while True:
+        try:
+            item = done_q.get(timeout=poll_interval)
+        except queue.Empty:
+            # No end-of-work sentinel will come from a dead process
+            if not asr_proc.is_alive():
+                break
+            continue
+        if item is None:
+            break
+        job, result, msg = item
+        with log_lock:
+            pending.pop(job["out_fpath"], None)
+
+        # Log elapsed time as ASR + embed time, as batchWhisper.py does
+        t_start = time.perf_counter() - job["asr_elapsed"]
+        if not msg:
+            job["mdata"]["fc_date"] = datetime.today().strftime('%Y-%m-%d')
+            msg = bw.finalize_vtt(result, job["out_fpath"], job["mdata"])
+
+        if job["downloaded"] and not args.keep_media \
+                and os.path.exists(job["av_fpath"]):
+            os.remove(job["av_fpath"])
+
+        if msg:
+            locked_log(log_lock, out_obj, bw.update_log, out_writer,
+                job["av_fpath"], job["av_fname"], msg=msg, t_start=t_start,
+                end_state=bw.result_state.ERROR.name)
+            continue
+        locked_log(log_lock, out_obj, bw.update_log, out_writer,
+            job["out_fpath"], job["out_fname"], msg="Successful transcription",
+            t_start=t_start, end_state=bw.result_state.SUCCESS.name)
+
+        if args.no_upload:
+            continue
+
+        vtt_uri = job["s3_uri"].rsplit("/", 1)[0] + "/" + job["out_fname"]
+        bucket, key = split_s3_uri(vtt_uri)
+        if upload_file(client, job["out_fpath"], bucket, key):
+            locked_log(log_lock, up_obj, update_upload_log, up_writer,
+                job["out_fpath"], job["out_fname"], vtt_uri,
+                "Successful upload", bw.result_state.SUCCESS.name)
+            with log_lock:
+                if first_vtt["time"] is None:
+                    first_vtt["time"] = time.perf_counter() - first_vtt["start"]
+                    print("Time to first delivered VTT: ", first_vtt["time"])
+        else:
+            locked_log(log_lock, up_obj, update_upload_log, up_writer,
+                job["out_fpath"], job["out_fname"], vtt_uri,
+                "Failed to upload", bw.result_state.ERROR.name)
+
+
+def main():
+    ### INPUT VALIDATION ######################################################
+    args = get_args()
+    if not (os.path.exists(args.inlist)):
+        bw.exit_msg("Filepath for inlist not found: ", args.inlist)
+    for folder in (args.scratch, args.outdir):
+        if not (os.path.exists(folder)):
+            print("Folder ", folder, " not found. Creating now")
+            try:
+                os.mkdir(folder)
+            except:
+                bw.exit_msg("Unable to create folder at path: ", folder)
+    if not (os.path.exists(args.upload_log)):
+        with open(args.upload_log, "w", newline='') as log_obj:
+            csv.writer(log_obj, delimiter=',').writerow(["Filepath", "Filename", "S3 URI"])
+    print("Validated args")
+
+    ### PIPELINE SET-UP #######################################################
+    t_pipeline = time.perf_counter()
+    client = boto3.client("s3", endpoint_url=args.endpoint_url)
+    ctx = mp.get_context("spawn")
+    dl_q = queue.Queue(maxsize=args.queue_size)
+    asr_q = ctx.Queue(maxsize=args.queue_size)
+    done_q = ctx.Queue(maxsize=args.queue_size)
+    log_lock = threading.Lock()
+    pending = {}                        # out_fpath -> job, sent to ASR stage
+    first_vtt = {"start": t_pipeline, "time": None}
+
+    asr_proc = ctx.Process(target=asr_worker,
+        args=(asr_q, done_q, args.w_settings, args.upload_workers))
+    asr_proc.start()
+
+    with open(args.inlist, newline='') as inlist_obj, \
+            open(args.outlist, "a", newline='') as outlist_obj, \
+            open(args.upload_log, "a", newline='') as uplog_obj:
+        in_reader = csv.reader(inlist_obj, delimiter=',')
+        next(in_reader)
+        out_log = (outlist_obj, csv.writer(outlist_obj, delimiter=','))
+        up_log = (uplog_obj, csv.writer(uplog_obj, delimiter=','))
+
+        dl_threads = [threading.Thread(target=download_worker,
+            args=(dl_q, asr_q, asr_proc, pending, client, args, out_log, log_lock))
+            for n in range(args.download_workers)]
+        up_threads = [threading.Thread(target=deliver_worker,
+            args=(done_q, asr_proc, pending, client, args, out_log, up_log,
+                  log_lock, first_vtt))
+            for n in range(args.upload_workers)]
+        for t in dl_threads + up_threads:
+            t.start()
+
+        ### FEED ROWS #########################################################
+        i = 0
+        for row in in_reader:
+            i += 1
+            av_fname = row[1]
+            out_fname = (os.path.splitext(av_fname))[0] + ".vtt"
+
+            mdata = bw.parse_row_mdata(row, bw.reset_mdata({}))
+            mdata_check = bw.validate_mdata(mdata)
+            if mdata_check:
+                locked_log(log_lock, outlist_obj, bw.update_log, out_log[1],
+                    row[0], av_fname, msg=mdata_check,
+                    t_start=time.perf_counter(),
+                    end_state=bw.result_state.ERROR.name)
+                continue
+
+            # Skip finished files before any S3 transfer on reruns
+            out_fpath = args.outdir + "/" + out_fname
+            if os.path.exists(out_fpath):
+                locked_log(log_lock, outlist_obj, bw.update_log, out_log[1],
+                    row[0], av_fname,
+                    msg="This file has already been transcribed. Skipping file.",
+                    t_start=time.perf_counter(),
+                    end_state=bw.result_state.ERROR.name)
+                continue
+
+            print(f"Queued row {i}: ", av_fname)
+            dl_q.put({"av_fpath": row[0], "av_fname": av_fname,
+                      "s3_uri": row[2], "mdata": mdata,
+                      "out_fname": out_fname,
+                      "out_fpath": out_fpath,
+                      "downloaded": False, "asr_elapsed": 0.0})
+
+        ### DRAIN #############################################################
+        for t in dl_threads:
+            dl_q.put(None)
+        for t in dl_threads:
+            t.join()
+        put_alive(asr_q, None, asr_proc)
+        for t in up_threads:
+            t.join()
+        asr_proc.join()
+
+        # Jobs the transcribe process took but never returned
+        if asr_proc.exitcode != 0:
+            print(asr_died_msg(asr_proc))
+            asr_q.cancel_join_thread()
+        for job in list(pending.values()):
+            if job["downloaded"] and not args.keep_media \
+                    and os.path.exists(job["av_fpath"]):
+                os.remove(job["av_fpath"])
+            locked_log(log_lock, outlist_obj, bw.update_log, out_log[1],
+                job["av_fpath"], job["av_fname"], msg=asr_died_msg(asr_proc),
+                t_start=time.perf_counter(), end_state=bw.result_state.ERROR.name)
+
+    print("Pipeline finished in ", time.perf_counter() - t_pipeline, " seconds")
+    print("Transcript file locations written to: " + args.outlist)
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/python
+
+# Per-file transcript quality index and triage.
+#
+# Scores each transcript from its segment statistics (see segment_stats.py)
+# and stores the scores in a SQLite index, so a model upgrade can re-run
+# only the weakest transcripts instead of the whole archive.
+#
+# Quality score, 0 (bad) to 1 (good):
+#     exp(mean avg_logprob) * (1 - flagged ratio) * (1 - fallback ratio / 2)
+#         * (1 - no-speech ratio / 2)
+#   mean avg_logprob: duration-weighted mean of segment avg_logprob
+#   flagged ratio   : share of audio in segments segment_stats flags
+#   fallback ratio  : share of segments that needed temperature fallback
+#   no-speech ratio : share of audio in segments the model thinks are silence
+#
+# Usage:
+#   python quality_index.py ingest [db] [stats_dir]
+#   python quality_index.py summary [db]
+#   python quality_index.py triage [db] [out inlist] --inlist [02 inlist] --threshold 0.5
+#   python quality_index.py triage [db] [out inlist] --inlist [02 inlist] --fraction 0.2
+
+from datetime import datetime
+
+import os, math, sqlite3
+import argparse
+
+import segment_stats as ss
+from run_report import file_key, write_inlist_subset
+
+schema = """CREATE TABLE IF NOT EXISTS quality (
+    file TEXT PRIMARY KEY,
+    source TEXT,
+    model TEXT,
+    language TEXT,
+    indexed TEXT,
+    duration REAL,
+    n_segments INTEGER,
+    mean_logprob REAL,
+    no_speech_ratio REAL,
+    fallback_ratio REAL,
+    flagged_ratio REAL,
+    score REAL)"""
+
+quality_cols = ["file", "source", "model", "language", "indexed", "duration",
+                "n_segments", "mean_logprob", "no_speech_ratio",
+                "fallback_ratio", "flagged_ratio", "score"]
+
+
+# Quality statistics for a list of Whisper segments
+def score_segments(segments, no_speech_threshold=ss.default_no_speech_threshold):
+    quality = {"duration": 0.0, "n_segments": len(segments),
+               "mean_logprob": 0.0, "no_speech_ratio": 0.0,
+               "fallback_ratio": 0.0, "flagged_ratio": 0.0, "score": 0.0}
+    if not segments:
+        return quality
+
+    durations = [max(s["end"] - s["start"], 0.0) for s in segments]
+    total = sum(durations) or 1.0
+    quality["duration"] = sum(durations)
+    quality["mean_logprob"] = sum(d * s.get("avg_logprob", 0.0)
+        for d, s in zip(durations, segments)) / total
+    quality["no_speech_ratio"] = sum(d for d, s in zip(durations, segments)
+        if s.get("no_speech_prob", 0.0) > no_speech_threshold) / total
+    quality["fallback_ratio"] = sum(1 for s in segments
+        if s.get("temperature", 0.0) > 0.0) / len(segments)
+    quality["flagged_ratio"] = min(sum(end - start for start, end, reasons
+        in ss.flag_windows(segments, merge_gap=0.0)) / total, 1.0)
+
+    quality["score"] = (math.exp(min(quality["mean_logprob"], 0.0))
+        * (1.0 - quality["flagged_ratio"])
+        * (1.0 - quality["fallback_ratio"] / 2.0)
+        * (1.0 - quality["no_speech_ratio"] / 2.0))
+    return quality
+
+
+class QualityIndex(object):
+    ''' SQLite index of per-file transcript quality
+
+    : param db_path: String, path of the SQLite index
+    '''
+    def __init__(self, db_path):
+        self._conn = sqlite3.connect(db_path, timeout=60)
+        self._conn.execute(schema)
+        self._conn.commit()
+
+    # Add or replace the entry for one transcript's stats
+    def add(self, fname, stats):
+        quality = score_segments(stats["segments"])
+        quality.update({"file": file_key(fname),
+                        "source": stats.get("source", ""),
+                        "model": stats.get("model", ""),
+                        "language": stats.get("language", ""),
+                        "indexed": datetime.now().strftime("%Y/%m/%d %H:%M:%S")})
+        self._conn.execute("INSERT OR REPLACE INTO quality VALUES ("
+            + ",".join("?" * len(quality_cols)) + ")",
+            [quality[c] for c in quality_cols])
+        self._conn.commit()
+        return quality
+
+    def ingest_dir(self, stats_dir):
+        n = 0
+        for name in sorted(os.listdir(stats_dir)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                stats = ss.read_segment_stats(os.path.join(stats_dir, name))
+                self.add(name, stats)
+                n += 1
+            except (OSError, ValueError, KeyError) as e:
+                print("Skipping unreadable stats file: ", name, e)
+        return n
+
+    # Files below a score threshold, or the weakest fraction of the index
+    def weakest(self, threshold=None, fraction=None):
+        if fraction is not None:
+            n_files = self._conn.execute("SELECT COUNT(*) FROM quality").fetchone()[0]
+            limit = int(math.ceil(n_files * fraction))
+            cur = self._conn.execute("SELECT file, source, score FROM quality "
+                "ORDER BY score ASC LIMIT ?", (limit,))
+        else:
+            cur = self._conn.execute("SELECT file, source, score FROM quality "
+                "WHERE score < ? ORDER BY score ASC", (threshold,))
+        return cur.fetchall()
+
+    def summary(self):
+        return self._conn.execute("""SELECT model, COUNT(*), AVG(score), MIN(score),
+            SUM(duration) / 3600.0 FROM quality GROUP BY model""").fetchall()
+
+
+# Write the original inlist rows of the weakest files to a new inlist
+def write_triage_inlist(fpath, weak, inlist):
+    return write_inlist_subset(fpath, [key for key, source, score in weak], inlist)
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["ingest", "summary", "triage"])
+    parser.add_argument("db", help="Path to SQLite quality index", type=str)
+    parser.add_argument("path", nargs="?", default=None,
+                        help="ingest: folder of stats JSON. triage: output inlist CSV",
+                        type=str)
+    parser.add_argument("--threshold", default=0.5,
+                        help="triage: include files scoring below this", type=float)
+    parser.add_argument("--fraction", default=None,
+                        help="triage: include this weakest fraction of files instead",
+                        type=float)
+    parser.add_argument("--inlist", default=None,
+                        help="triage: original 02 inlist to copy metadata rows from (required)",
+                        type=str)
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    args = get_args()
+    index = QualityIndex(args.db)
+
+    if args.command == "ingest":
+        if not args.path or not os.path.isdir(args.path):
+            print("Stats folder not found: ", args.path)
+            print("Exiting")
+            exit()
+        print("Indexed files: ", index.ingest_dir(args.path))
+    elif args.command == "triage":
+        if not args.path:
+            print("No output inlist path provided")
+            print("Exiting")
+            exit()
+        if not args.inlist or not os.path.exists(args.inlist):
+            print("triage needs --inlist to copy each file's metadata row: ", args.inlist)
+            print("Exiting")
+            exit()
+        weak = index.weakest(args.threshold, args.fraction)
+        missing = write_triage_inlist(args.path, weak, args.inlist)
+        print(f"Wrote {len(weak) - len(missing)} files to triage inlist: ", args.path)
+
+    print(f"{'Model':<20} {'Files':>8} {'Mean score':>11} {'Min score':>10} {'Hours':>9}")
+    for model, n, mean, low, hours in index.summary():
+        print(f"{model:<20} {n:>8} {mean:>11.3f} {low:>10.3f} {hours:>9.1f}")
+
+if __name__=="__main__":
+    main()
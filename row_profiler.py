@@ -0,0 +1,169 @@
+#!/usr/bin/python
+
+# Opt-in per-row profiling for the batch ASR scripts.
+#
+# Captures a cProfile profile (and optionally a torch profiler trace) for
+# selected inlist rows: by row number, by filename pattern, or the slowest N
+# rows of the run. Output goes to [outlist stem]_profiles/ next to the run
+# log:
+#   row[i]_[stem].prof     cProfile stats (flameprof, snakeviz, gprof2dot)
+#   row[i]_[stem].stacks   torch collapsed stacks (flamegraph.pl)
+#   row[i]_[stem].json     torch Chrome trace (chrome://tracing, Perfetto)
+#   profiles.csv           index of profiled rows and their elapsed time
+# When no selector is given the scripts never create a profiler, so there
+# is no overhead.
+
+from datetime import datetime
+
+import os, time, fnmatch, heapq, cProfile
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+from csv_log import open_csv_log, sidecar_log_path
+
+profile_log_header = ["Row", "Filename", "Elapsed Time", "Reason",
+                      "Completion Time", "Files"]
+
+
+def add_profile_args(parser):
+    parser.add_argument("--profile_rows", default=None,
+                        help="Rows to profile, e.g. 3,10-12", type=str, required=False)
+    parser.add_argument("--profile_match", default=None,
+                        help="Profile rows whose filename matches this pattern, e.g. car_0001*",
+                        type=str, required=False)
+    parser.add_argument("--profile_slowest", default=0,
+                        help="Keep profiles for the N slowest rows of the run",
+                        type=int, required=False)
+    parser.add_argument("--profile_torch", action="store_true",
+                        help="Also capture torch profiler traces for profiled rows")
+    parser.add_argument("--profile_dir", default=None,
+                        help="Folder for profiles. Defaults to [outlist]_profiles",
+                        type=str, required=False)
+
+
+# Parse "3,10-12" into {3, 10, 11, 12}
+def parse_rows(spec):
+    rows = set()
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            rows.update(range(int(start), int(end) + 1))
+        else:
+            rows.add(int(part))
+    return rows
+
+
+class RowProfiler(object):
+    ''' Starts and stops profilers around selected rows of a batch loop
+
+    : param out_dir : String, folder for profile output
+    : param rows    : Set of Ints, row numbers to always profile
+    : param pattern : String, fnmatch pattern of filenames to always profile
+    : param slowest : Int, number of slowest rows to keep profiles for
+    : param use_torch: Bool, also run the torch profiler
+    '''
+    def __init__(self, out_dir, rows=None, pattern=None, slowest=0,
+                 use_torch=False):
+        self._dir = out_dir
+        self._rows = rows or set()
+        self._pattern = pattern
+        self._slowest = slowest
+        self._use_torch = use_torch and torch is not None
+        self._slow_heap = []            # (elapsed, row, file paths, log entry)
+        self._active = None
+        os.makedirs(self._dir, exist_ok=True)
+
+        log_path = os.path.join(self._dir, "profiles.csv")
+        self._log_obj, self._log_writer = open_csv_log(log_path, profile_log_header)
+
+    @classmethod
+    def from_args(cls, args, outlist):
+        if not (args.profile_rows or args.profile_match or args.profile_slowest):
+            return None
+        out_dir = args.profile_dir or sidecar_log_path(outlist, "_profiles")
+        print("Profiling selected rows to: ", out_dir)
+        return cls(out_dir, parse_rows(args.profile_rows), args.profile_match,
+                   args.profile_slowest, args.profile_torch)
+
+    def _reason(self, i, fname):
+        if i in self._rows:
+            return "row"
+        if self._pattern and fnmatch.fnmatch(fname, self._pattern):
+            return "match"
+        if self._slowest > 0:
+            return "slowest"
+        return None
+
+    # Call at the start of each row. Ends any row still being profiled.
+    def start_row(self, i, fname):
+        self.end_row()
+        reason = self._reason(i, fname)
+        if reason is None:
+            return
+
+        prof = cProfile.Profile()
+        torch_prof = None
+        if self._use_torch:
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            torch_prof = torch.profiler.profile(activities=activities,
+                                                with_stack=True)
+            torch_prof.__enter__()
+        self._active = {"row": i, "fname": fname, "reason": reason,
+                        "prof": prof, "torch_prof": torch_prof,
+                        "t_start": time.perf_counter()}
+        prof.enable()
+
+    # Stop profiling the current row, if any, and write its output
+    def end_row(self):
+        active, self._active = self._active, None
+        if active is None:
+            return
+        active["prof"].disable()
+        elapsed = time.perf_counter() - active["t_start"]
+        if active["torch_prof"] is not None:
+            active["torch_prof"].__exit__(None, None, None)
+
+        stem = os.path.splitext(os.path.basename(active["fname"]))[0]
+        base = os.path.join(self._dir, f"row{active['row']}_{stem}")
+        paths = [base + ".prof"]
+        active["prof"].dump_stats(paths[0])
+        if active["torch_prof"] is not None:
+            try:
+                active["torch_prof"].export_stacks(base + ".stacks", "self_cpu_time_total")
+                active["torch_prof"].export_chrome_trace(base + ".json")
+                paths += [base + ".stacks", base + ".json"]
+            except (RuntimeError, OSError) as e:
+                print("Unable to export torch profile: ", e)
+
+        entry = [active["row"], active["fname"], elapsed, active["reason"],
+                 datetime.now().strftime("%Y/%m/%d %H:%M:%S"), ";".join(paths)]
+
+        # Slowest-N rows: keep only the N slowest profiles on disk, and
+        # log them once the run is over
+        if active["reason"] == "slowest":
+            item = (elapsed, active["row"], paths, entry)
+            if len(self._slow_heap) < self._slowest:
+                heapq.heappush(self._slow_heap, item)
+            else:
+                dropped = heapq.heappushpop(self._slow_heap, item)
+                for p in dropped[2]:
+                    if os.path.exists(p):
+                        os.remove(p)
+            return
+
+        self._log_writer.writerow(entry)
+        self._log_obj.flush()
+
+    def close(self):
+        self.end_row()
+        for item in sorted(self._slow_heap, reverse=True):
+            self._log_writer.writerow(item[3])
+        self._log_obj.close()
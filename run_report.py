@@ -0,0 +1,302 @@
+#!/usr/bin/python
+
+# Run report for the CA-R BatchASR workflow.
+#
+# Streams the download (01), transcription (02) and upload (03) logs,
+# indexes them by object identifier and file, keeps only the latest
+# attempt per file, and reports per-state counts, throughput over time,
+# the slowest transcriptions and retry inlists for failed files.
+# Replaces pasting outlists into FileCounter.xlsx / *_concatter.xlsx.
+
+from datetime import datetime
+from collections import Counter, defaultdict
+
+import os, csv, heapq
+import argparse
+
+time_fmt = "%Y/%m/%d %H:%M:%S"
+
+# End states, in pipeline order
+states = ["DOWNLOADED", "TRANSCRIBE_FAILED", "TRANSCRIBED",
+          "UPLOAD_FAILED", "UPLOADED"]
+
+# Transcription log messages that re-running the same file will not fix
+non_retryable_msgs = ["Not a supported A/V file", "Blank file",
+                      "No audio tracks", "All audio tracks blank",
+                      "Blank transcript", "Duplicate VTT of"]
+already_done_msg = "This file has already been transcribed"
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--download", default=None,
+                        help="Download log CSV from step 01 (01_outlist.csv)", type=str)
+    parser.add_argument("--transcribe", default=None,
+                        help="Transcription log CSV from step 02 (02_outlist.csv)", type=str)
+    parser.add_argument("--upload", default=None,
+                        help="Upload log CSV from step 03 (03_outlist.csv)", type=str)
+    parser.add_argument("--inlist", default=None,
+                        help="Original 02 inlist to copy metadata rows from. Required with --retry_transcribe",
+                        type=str)
+    parser.add_argument("--retry_transcribe", default=None,
+                        help="Output inlist of files to re-transcribe", type=str)
+    parser.add_argument("--retry_upload", default=None,
+                        help="Output inlist of VTTs to re-upload", type=str)
+    parser.add_argument("--slowest", default=10,
+                        help="Number of slowest transcriptions to list", type=int)
+    parser.add_argument("--bucket", default="hour", choices=["minute", "hour", "day"],
+                        help="Time bucket for throughput")
+    args = parser.parse_args()
+    return args
+
+
+# Key for a file across all three logs: filename without extension,
+# so car_000092_t1_a_access.mp3/.mka/.vtt all join to the same record
+def file_key(fname):
+    return os.path.splitext(os.path.basename(fname.replace("\\", "/")))[0]
+
+
+def object_id(key):
+    return "_".join(key.split("_")[0:2])
+
+
+# Stream rows from a log CSV, skipping header and blank rows
+def read_rows(fpath, min_cols):
+    with open(fpath, newline='', encoding="utf-8-sig") as f:
+        for row in csv.reader(f, delimiter=','):
+            if len(row) < min_cols or not row[1] or row[0] == "Filepath":
+                continue
+            yield row
+
+
+def parse_time(value):
+    try:
+        return datetime.strptime(value, time_fmt)
+    except (ValueError, TypeError):
+        return None
+
+
+def bucket_time(t, bucket):
+    if bucket == "minute":
+        return t.strftime("%Y/%m/%d %H:%M")
+    elif bucket == "hour":
+        return t.strftime("%Y/%m/%d %H:00")
+    return t.strftime("%Y/%m/%d")
+
+
+def new_record():
+    return {"av_path": "", "av_name": "", "s3_uri": "",
+            "t_state": None, "t_msg": "", "t_time": "", "t_elapsed": None,
+            "vtt_path": "", "vtt_name": "",
+            "u_state": None, "u_msg": "", "u_time": ""}
+
+
+# Build index: {object identifier: {file key: record}}
+def build_index(args):
+    index = defaultdict(lambda: defaultdict(new_record))
+    n_rows = Counter()
+
+    # 01 log only contains successful downloads: Filepath, Filename, S3 URI
+    if args.download:
+        for row in read_rows(args.download, 3):
+            key = file_key(row[1])
+            rec = index[object_id(key)][key]
+            rec["av_path"], rec["av_name"], rec["s3_uri"] = row[0], row[1], row[2]
+            n_rows["download"] += 1
+
+    # 02 log: Filepath, Filename, Elapsed Time, Message, Completion Time, Endstate
+    if args.transcribe:
+        for row in read_rows(args.transcribe, 6):
+            key = file_key(row[1])
+            rec = index[object_id(key)][key]
+            n_rows["transcribe"] += 1
+
+            msg, t_done, end_state = row[3], row[4], row[5]
+            # Skips of already-transcribed files never override a real attempt
+            if msg.startswith(already_done_msg):
+                if rec["t_state"] is None:
+                    rec["t_state"], rec["t_msg"], rec["t_time"] = "SUCCESS", msg, t_done
+                continue
+            # Keep latest attempt; later rows win ties
+            if rec["t_time"] and t_done < rec["t_time"]:
+                continue
+
+            rec["t_state"], rec["t_msg"], rec["t_time"] = end_state, msg, t_done
+            try:
+                rec["t_elapsed"] = float(row[2])
+            except ValueError:
+                rec["t_elapsed"] = None
+            if row[0].endswith(".vtt"):
+                rec["vtt_path"], rec["vtt_name"] = row[0], row[1]
+            elif not rec["av_path"]:
+                rec["av_path"], rec["av_name"] = row[0], row[1]
+
+    # 03 log: Filepath, Filename, S3 URI, Time, Message, Result
+    if args.upload:
+        for row in read_rows(args.upload, 6):
+            key = file_key(row[1])
+            rec = index[object_id(key)][key]
+            n_rows["upload"] += 1
+
+            if rec["u_time"] and row[3] < rec["u_time"]:
+                continue
+            rec["u_state"], rec["u_msg"], rec["u_time"] = row[5], row[4], row[3]
+            rec["vtt_path"], rec["vtt_name"] = row[0], row[1]
+            if not rec["s3_uri"]:
+                rec["s3_uri"] = row[2]
+
+    return index, n_rows
+
+
+def final_state(rec):
+    if rec["u_state"] == "SUCCESS":
+        return "UPLOADED"
+    elif rec["u_state"] is not None:
+        return "UPLOAD_FAILED"
+    elif rec["t_state"] == "SUCCESS":
+        return "TRANSCRIBED"
+    elif rec["t_state"] is not None:
+        return "TRANSCRIBE_FAILED"
+    return "DOWNLOADED"
+
+
+def retryable(rec):
+    return not any(rec["t_msg"].startswith(m) for m in non_retryable_msgs)
+
+
+# Rows of an 02 inlist keyed by file_key(Filename). Returns (header, rows).
+def read_inlist_rows(inlist):
+    rows = {}
+    with open(inlist, newline='', encoding="utf-8-sig") as f:
+        reader = csv.reader(f, delimiter=',')
+        header = next(reader)
+        for row in reader:
+            if len(row) > 1:
+                rows[file_key(row[1])] = row
+    return header, rows
+
+
+# Write the original inlist rows for keys to a new inlist, with all their
+# metadata columns. Files missing from the inlist are left out, since a
+# row without metadata stops batchWhisper.py, and are listed in
+# [fpath stem]_unmatched.csv instead. Returns the missing keys.
+def write_inlist_subset(fpath, keys, inlist):
+    header, rows = read_inlist_rows(inlist)
+    missing = []
+    with open(fpath, "w", newline='') as f:
+        writer = csv.writer(f, delimiter=',')
+        writer.writerow(header)
+        for key in keys:
+            if key in rows:
+                writer.writerow(rows[key])
+            else:
+                missing.append(key)
+
+    if missing:
+        unmatched = os.path.splitext(fpath)[0] + "_unmatched.csv"
+        with open(unmatched, "w", newline='') as f:
+            writer = csv.writer(f, delimiter=',')
+            writer.writerow(["File"])
+            writer.writerows([key] for key in missing)
+        print(f"Files not found in inlist: {len(missing)}, listed in: ", unmatched)
+    return missing
+
+
+def write_retry_transcribe(fpath, failed, inlist):
+    return write_inlist_subset(fpath, [key for key, rec in failed], inlist)
+
+
+def write_retry_upload(fpath, failed):
+    with open(fpath, "w", newline='') as f:
+        writer = csv.writer(f, delimiter=',')
+        writer.writerow(["Filepath", "Filename", "S3 URI"])
+        for key, rec in failed:
+            # Upload inlist expects the VTT's own S3 URI
+            s3_uri = rec["s3_uri"]
+            if s3_uri and not s3_uri.endswith(".vtt"):
+                s3_uri = s3_uri.rsplit("/", 1)[0] + "/" + rec["vtt_name"]
+            writer.writerow([rec["vtt_path"], rec["vtt_name"], s3_uri])
+
+
+def main():
+    args = get_args()
+    for log in (args.download, args.transcribe, args.upload, args.inlist):
+        if log and not os.path.exists(log):
+            print("Log file not found: ", log)
+            print("Exiting")
+            exit()
+    if args.retry_transcribe and not args.inlist:
+        print("--retry_transcribe needs --inlist to copy each file's metadata row")
+        print("Exiting")
+        exit()
+    if not (args.download or args.transcribe or args.upload):
+        print("No logs provided. Use --download, --transcribe and/or --upload")
+        exit()
+
+    index, n_rows = build_index(args)
+
+    state_counts = Counter()
+    t_throughput, u_throughput = Counter(), Counter()
+    t_busy = defaultdict(float)
+    slowest = []
+    retry_t, retry_u = [], []
+
+    for obj_id, files in index.items():
+        for key, rec in files.items():
+            state = final_state(rec)
+            state_counts[state] += 1
+
+            if rec["t_state"] == "SUCCESS":
+                t = parse_time(rec["t_time"])
+                if t is not None:
+                    t_throughput[bucket_time(t, args.bucket)] += 1
+                    t_busy[bucket_time(t, args.bucket)] += rec["t_elapsed"] or 0.0
+            if rec["u_state"] == "SUCCESS":
+                t = parse_time(rec["u_time"])
+                if t is not None:
+                    u_throughput[bucket_time(t, args.bucket)] += 1
+
+            if rec["t_elapsed"] is not None:
+                item = (rec["t_elapsed"], key, rec["t_msg"])
+                if len(slowest) < args.slowest:
+                    heapq.heappush(slowest, item)
+                elif args.slowest > 0:
+                    heapq.heappushpop(slowest, item)
+
+            if state == "TRANSCRIBE_FAILED" and retryable(rec):
+                retry_t.append((key, rec))
+            elif state == "UPLOAD_FAILED":
+                retry_u.append((key, rec))
+
+    n_files = sum(state_counts.values())
+    print("### RUN REPORT ##############################################")
+    print("Log rows read: ", ", ".join(f"{k}={v}" for k, v in n_rows.items()))
+    print(f"Objects: {len(index)}    Files: {n_files}")
+    print("")
+    print("Latest state per file:")
+    for state in states:
+        print(f"    {state:<18} {state_counts[state]}")
+
+    print("")
+    print(f"Throughput per {args.bucket}:")
+    print(f"    {'Time':<18} {'Transcribed':>12} {'ASR seconds':>12} {'Uploaded':>10}")
+    for b in sorted(set(t_throughput) | set(u_throughput)):
+        print(f"    {b:<18} {t_throughput[b]:>12} {t_busy[b]:>12.1f} {u_throughput[b]:>10}")
+
+    print("")
+    print(f"Slowest {len(slowest)} transcription attempts:")
+    for elapsed, key, msg in sorted(slowest, reverse=True):
+        print(f"    {elapsed:>10.1f}s  {key}  ({msg})")
+
+    print("")
+    print(f"Retryable transcription failures: {len(retry_t)}")
+    print(f"Upload failures: {len(retry_u)}")
+    if args.retry_transcribe:
+        write_retry_transcribe(args.retry_transcribe, retry_t, args.inlist)
+        print("Wrote transcription retry inlist to: ", args.retry_transcribe)
+    if args.retry_upload:
+        write_retry_upload(args.retry_upload, retry_u)
+        print("Wrote upload retry inlist to: ", args.retry_upload)
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/python
+
+# S3 transfer benchmark for s3_download.py and s3_upload.py.
+#
+# Runs the workflow's own transfer functions against a local S3-compatible
+# server (e.g. MinIO or moto_server) with synthetic objects of realistic
+# sizes, from many small VTTs to multi-GB MOVs. Sweeps file-level threads,
+# per-file transfer concurrency and multipart chunk size, and reports MB/s,
+# HTTP requests per second and per-object latency percentiles.
+#
+# Usage:
+#   python s3_bench.py --endpoint_url http://localhost:9000 \
+#       --threads 1,4 --concurrency 4,10 --chunk_mb 8,64 --scale 0.1
+
+import os, csv, io, time, shutil, tempfile, threading, random
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+
+import s3_download
+import s3_upload
+
+production_bucket = "car-archi-objects"
+MB = 1024 * 1024
+
+# Synthetic object mix: (kind, count, min size, max size) in bytes.
+# Sizes are drawn log-uniformly; --scale shrinks the media files.
+object_mix = [
+    ("vtt", 200, 2 * 1024, 200 * 1024),
+    ("mp3", 20, 5 * MB, 150 * MB),
+    ("mov", 2, 500 * MB, 4096 * MB),
+]
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--endpoint_url", required=True,
+                        help="URL of a local S3-compatible server", type=str)
+    parser.add_argument("--bucket", default="car-bench",
+                        help="Scratch bucket on the local server", type=str)
+    parser.add_argument("--threads", default="1,4",
+                        help="Files transferred in parallel, comma-separated sweep", type=str)
+    parser.add_argument("--concurrency", default="10",
+                        help="TransferConfig max_concurrency per file, comma-separated sweep",
+                        type=str)
+    parser.add_argument("--chunk_mb", default="8",
+                        help="Multipart threshold/chunk size in MB, comma-separated sweep",
+                        type=str)
+    parser.add_argument("--scale", default=0.1,
+                        help="Multiplier for mp3/mov sizes and counts (VTTs are not scaled)",
+                        type=float)
+    parser.add_argument("--out", default=None,
+                        help="CSV to write results to", type=str)
+    parser.add_argument("--seed", default=0, help="Random seed for object sizes",
+                        type=int)
+    args = parser.parse_args()
+    return args
+
+
+def parse_sweep(spec, cast=int):
+    return [cast(v) for v in spec.split(",") if v.strip()]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(int(round(pct / 100.0 * (len(values) - 1))), len(values) - 1)
+    return values[k]
+
+
+# Write synthetic files to src_dir. Returns [(key, local path, size)].
+def make_objects(src_dir, scale, seed):
+    rng = random.Random(seed)
+    block = os.urandom(MB)
+    objects = []
+    for kind, count, low, high in object_mix:
+        if kind != "vtt":
+            count = max(1, int(round(count * scale)))
+            low, high = int(low * scale), int(high * scale)
+        for n in range(count):
+            size = int(low * (high / low) ** rng.random())
+            obj_id = f"car_{len(objects):06d}"
+            name = f"{obj_id}_t1_a_access.{kind}"
+            fpath = os.path.join(src_dir, name)
+            with open(fpath, "wb") as f:
+                remaining = size
+                while remaining > 0:
+                    f.write(block[:min(remaining, MB)])
+                    remaining -= MB
+            objects.append((f"media/{obj_id}/{name}", fpath, size))
+    return objects
+
+
+class RequestCounter(object):
+    ''' Counts HTTP requests a boto3 client sends, across threads '''
+    def __init__(self, client):
+        self.n = 0
+        self._lock = threading.Lock()
+        client.meta.events.register("before-send.s3.*", self)
+
+    def __call__(self, **kwargs):
+        with self._lock:
+            self.n += 1
+
+
+# Run fn(obj) over objects; fn returns True if the transfer succeeded.
+# Returns (elapsed, latencies of successful transfers, bytes transferred,
+# number of failed transfers).
+def run_transfers(fn, objects, n_threads):
+    latencies = []
+    totals = {"bytes": 0, "failed": 0}
+    lock = threading.Lock()
+    def timed(obj):
+        t_start = time.perf_counter()
+        try:
+            ok = fn(obj)
+        except Exception as e:
+            print("Transfer failed for ", obj[0], e)
+            ok = False
+        elapsed = time.perf_counter() - t_start
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+                totals["bytes"] += obj[2]
+            else:
+                totals["failed"] += 1
+    t_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_threads) as pool:
+        list(pool.map(timed, objects))
+    return time.perf_counter() - t_start, latencies, totals["bytes"], totals["failed"]
+
+
+def main():
+    args = get_args()
+    if args.bucket == production_bucket:
+        print("Refusing to benchmark against the production bucket")
+        print("Exiting")
+        exit()
+
+    client = boto3.client("s3", endpoint_url=args.endpoint_url)
+    try:
+        client.head_bucket(Bucket=args.bucket)
+    except ClientError:
+        client.create_bucket(Bucket=args.bucket)
+    counter = RequestCounter(client)
+
+    work_dir = tempfile.mkdtemp(prefix="s3_bench_")
+    src_dir = os.path.join(work_dir, "src")
+    dst_dir = os.path.join(work_dir, "dst")
+    os.mkdir(src_dir)
+    os.mkdir(dst_dir)
+
+    results = []
+    try:
+        objects = make_objects(src_dir, args.scale, args.seed)
+        total_mb = sum(size for key, fpath, size in objects) / MB
+        print(f"Generated {len(objects)} objects, {total_mb:.1f} MB")
+
+        for n_threads in parse_sweep(args.threads):
+            for concurrency in parse_sweep(args.concurrency):
+                for chunk_mb in parse_sweep(args.chunk_mb):
+                    config = TransferConfig(max_concurrency=concurrency,
+                        multipart_threshold=chunk_mb * MB,
+                        multipart_chunksize=chunk_mb * MB)
+
+                    # Upload with s3_upload.upload_file, without its
+                    # per-file throttle sleep
+                    def upload(obj):
+                        key, fpath, size = obj
+                        return s3_upload.upload_file(client, fpath, args.bucket,
+                            key, config=config, throttle=0)
+
+                    # Download with s3_download.s3_download into scratch. It
+                    # logs and swallows errors, so check the file it wrote.
+                    def download(obj):
+                        key, fpath, size = obj
+                        out_fpath = os.path.join(dst_dir, os.path.basename(key))
+                        s3_download.s3_download(client, args.bucket, "bench://" + key,
+                            dst_dir, csv.writer(io.StringIO()), config=config)
+                        return (os.path.exists(out_fpath)
+                                and os.path.getsize(out_fpath) == size)
+
+                    for op, fn in (("upload", upload), ("download", download)):
+                        counter.n = 0
+                        elapsed, latencies, n_bytes, n_failed = run_transfers(
+                            fn, objects, n_threads)
+                        if n_failed:
+                            print(f"{op}: {n_failed} of {len(objects)} transfers failed")
+                        # Throughput and latency only over completed transfers
+                        row = {"op": op, "threads": n_threads,
+                               "concurrency": concurrency, "chunk_mb": chunk_mb,
+                               "seconds": elapsed, "failed": n_failed,
+                               "mb_per_s": n_bytes / MB / elapsed,
+                               "requests_per_s": counter.n / elapsed,
+                               "p50": percentile(latencies, 50),
+                               "p95": percentile(latencies, 95),
+                               "p99": percentile(latencies, 99),
+                               "max": max(latencies, default=0.0)}
+                        results.append(row)
+                        for name in os.listdir(dst_dir):
+                            os.remove(os.path.join(dst_dir, name))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    cols = ["op", "threads", "concurrency", "chunk_mb", "seconds", "failed",
+            "mb_per_s", "requests_per_s", "p50", "p95", "p99", "max"]
+    print("")
+    print(f"{'op':<9}{'thr':>4}{'conc':>5}{'chunk':>6}{'fail':>5}{'MB/s':>9}{'req/s':>8}"
+          f"{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}{'max s':>8}")
+    for r in results:
+        print(f"{r['op']:<9}{r['threads']:>4}{r['concurrency']:>5}{r['chunk_mb']:>6}"
+              f"{r['failed']:>5}{r['mb_per_s']:>9.1f}{r['requests_per_s']:>8.1f}{r['p50']:>8.3f}"
+              f"{r['p95']:>8.3f}{r['p99']:>8.3f}{r['max']:>8.3f}")
+    if args.out:
+        with open(args.out, "w", newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=cols)
+            writer.writeheader()
+            writer.writerows(results)
+        print("Wrote results to: ", args.out)
+
+if __name__=="__main__":
+    main()
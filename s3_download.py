@@ -5,6 +5,8 @@ from pathlib import Path
 import argparse
 import boto3
 
+from av_extract import is_video, extract_audio
+
 
 storage_threshold=0.1
 
@@ -29,11 +31,16 @@ def get_args():
                     type=str)
         parser.add_argument("outlist", default="01_outlist.csv", help="Local filepath to download results CSV",
                     type=str)
+        parser.add_argument("--extract_audio", action="store_true",
+                    help="Demux the audio stream of downloaded videos into a .mka sidecar")
+        parser.add_argument("--keep_video", action="store_true",
+                    help="Keep downloaded videos after audio extraction")
         args = parser.parse_args()
         return args
         
 
-def s3_download(client, bucket, file, outpath, outlist_f):
+def s3_download(client, bucket, file, outpath, outlist_f,
+                extract=False, keep_video=False, config=None):
         ''' Downloads a file from S3, writes results to CSV at outlist_f
 
         : param client: S3 object, s3 client object
@@ -41,6 +48,9 @@ def s3_download(client, bucket, file, outpath, outlist_f):
         : cell        : List of Strings, cell contents from input CSV
         : outpath     : String, local path for destination downloads from S3
         : outlist_f   : CSV reader object for output CSV of download results
+        : extract     : Bool, replace downloaded videos with an audio-only sidecar
+        : keep_video  : Bool, keep the video file after audio extraction
+        : config      : boto3 TransferConfig for the download, or None for defaults
         '''
         file_key = file.split("//")[-1]
         file_name = file.split("/")[-1]
@@ -49,7 +59,7 @@ def s3_download(client, bucket, file, outpath, outlist_f):
 
         print("file_key: ", file_key)
 
-        s3_obj = s3.head_object(
+        s3_obj = client.head_object(
                 Bucket=bucket,
                 Key=file_key)
 
@@ -57,8 +67,7 @@ def s3_download(client, bucket, file, outpath, outlist_f):
         download_logger =  S3DownloadLogger(s3_obj['ContentLength'], file_key)
 
         # Check if available space to download the file
-        out_vol = Path(outpath).absolute().drive
-        out_vol_stats = shutil.disk_usage(out_vol)
+        out_vol_stats = shutil.disk_usage(Path(outpath).absolute())
 
         if out_vol_stats.free - s3_obj['ContentLength'] < out_vol_stats.total * storage_threshold:
                 print("Downloading file would exceed recommended storage threshold.")
@@ -67,14 +76,30 @@ def s3_download(client, bucket, file, outpath, outlist_f):
 
         try:
                 client.download_file(bucket, file_key, file_outpath,
-                                     Callback=download_logger)
+                                     Callback=download_logger, Config=config)
                 logging.info(f"Downloaded {file_key}")
-                outlist_f.writerow([file_outpath, file_name, s3_uri])   
         except:
                 logging.info(f"Failed to download {file_key}")
+                print("\n")
+                return
+
+        # Demux audio from videos so later steps never read the video stream
+        if extract and is_video(file_outpath):
+                audio_outpath = extract_audio(file_outpath, outpath)
+                if audio_outpath is None:
+                        logging.info(f"No audio extracted from {file_name}, keeping video")
+                else:
+                        logging.info(f"Extracted audio to {audio_outpath}")
+                        if not keep_video:
+                                os.remove(file_outpath)
+                        # Filename stays the archived video's name: it is the
+                        # FADGI Originating File. Only Filepath points at the sidecar.
+                        file_outpath = audio_outpath
+        outlist_f.writerow([file_outpath, file_name, s3_uri])
         print("\n")
 
-def download_loop(client, bucket, cell, outpath, outlist_f):
+def download_loop(client, bucket, cell, outpath, outlist_f,
+                  extract=False, keep_video=False):
         ''' Loop warpper for s3_download().
             Iterates over 1 cell from input CSV,
             Downloads files from S3 for each object in file
@@ -92,7 +117,8 @@ def download_loop(client, bucket, cell, outpath, outlist_f):
                 num = 1
                 for f in files:
                         print(f"File {num} of {len(files)}")
-                        s3_download(client, bucket, f, outpath, outlist_f)
+                        s3_download(client, bucket, f, outpath, outlist_f,
+                                    extract, keep_video)
                         num += 1
         else: print("        NONE")
 
@@ -102,76 +128,81 @@ bucket = "car-archi-objects"                      # S3 bucket
 input_fields={"obj_object_identifier": None,      # dict of fields from input CSV
         "obj_audio_files": None,
         "obj_moving_image_files": None}
-s3 = boto3.client('s3')                           # S3 object
-i = 0
-### INPUT VALIDATION ###########################################################
-# Args:
-        # input: CSV of target files
-        # output: Local destination
-        # output: CSV of download results
-args = get_args()
+def main():
+        s3 = boto3.client('s3')                           # S3 object
+        i = 0
+        ### INPUT VALIDATION ###########################################################
+        # Args:
+                # input: CSV of target files
+                # output: Local destination
+                # output: CSV of download results
+        args = get_args()
         
-if not (os.path.exists(args.inlist)):
-        print("Filepath for inlist not found: ", args.inlist, "Exiting.")
-        exit()
-
-if not (os.path.exists(args.outdir)):
-        print("Output directory not found: ", args.outdir, "Creating now.")
-        try:
-                os.mkdir(args.outdir)
-                print("Made output directory: ", args.outdir)
-        except:
-                print("Unable to create output directory. Exiting.")
+        if not (os.path.exists(args.inlist)):
+                print("Filepath for inlist not found: ", args.inlist, "Exiting.")
                 exit()
 
-if not (os.path.exists(args.outlist)):
-        print("Filepath for outlist not found: ", args.outlist, "Creating now.")
-        try:
-                f = open(args.outlist, "w", newline='')
-                f.close()
-                print("Created results file at outlist path: ", args.outlist)
-        except:
-                print("Unable to create results file: ", args.outlist, ". Exiting.")
-                exit()
+        if not (os.path.exists(args.outdir)):
+                print("Output directory not found: ", args.outdir, "Creating now.")
+                try:
+                        os.mkdir(args.outdir)
+                        print("Made output directory: ", args.outdir)
+                except:
+                        print("Unable to create output directory. Exiting.")
+                        exit()
+
+        if not (os.path.exists(args.outlist)):
+                print("Filepath for outlist not found: ", args.outlist, "Creating now.")
+                try:
+                        f = open(args.outlist, "w", newline='')
+                        f.close()
+                        print("Created results file at outlist path: ", args.outlist)
+                except:
+                        print("Unable to create results file: ", args.outlist, ". Exiting.")
+                        exit()
                 
-###############################################################################
-
-### S3 DOWNLOAD BATCH-PROCESS LOOP ############################################
-with open(args.inlist, newline='') as inlist_obj:
-        in_reader = csv.reader(inlist_obj, delimiter=',')
-
-        # Get indices of input fields
-        header = next(in_reader)
-        for c in header:
-                for key, value in input_fields.items():
-                        if value == None and c == key:
-                                input_fields.update({key: i})
-                i += 1
-        num_rows = sum(1 for row in inlist_obj)
-        inlist_obj.seek(0)
-        next(in_reader)
-
-        with open(args.outlist, "a", newline='') as outlist_obj:
-                out_writer = csv.writer(outlist_obj, delimiter=',')
-                i = 1
-                # Batch-process loop
-                for row in in_reader:
-                        # Retrieve info from input CSV fields
-                        obj_id = row[input_fields.get("obj_object_identifier")]
-                        audio_cell = row[input_fields.get("obj_audio_files")]
-                        vid_cell = row[input_fields.get("obj_moving_image_files")]
-
-                        print(f"Row {i} of {num_rows}")
-                        print("Object: ", obj_id)
+        ###############################################################################
+
+        ### S3 DOWNLOAD BATCH-PROCESS LOOP ############################################
+        with open(args.inlist, newline='') as inlist_obj:
+                in_reader = csv.reader(inlist_obj, delimiter=',')
+
+                # Get indices of input fields
+                header = next(in_reader)
+                for c in header:
+                        for key, value in input_fields.items():
+                                if value == None and c == key:
+                                        input_fields.update({key: i})
+                        i += 1
+                num_rows = sum(1 for row in inlist_obj)
+                inlist_obj.seek(0)
+                next(in_reader)
+
+                with open(args.outlist, "a", newline='') as outlist_obj:
+                        out_writer = csv.writer(outlist_obj, delimiter=',')
+                        i = 1
+                        # Batch-process loop
+                        for row in in_reader:
+                                # Retrieve info from input CSV fields
+                                obj_id = row[input_fields.get("obj_object_identifier")]
+                                audio_cell = row[input_fields.get("obj_audio_files")]
+                                vid_cell = row[input_fields.get("obj_moving_image_files")]
+
+                                print(f"Row {i} of {num_rows}")
+                                print("Object: ", obj_id)
                         
-                        if audio_cell == None and vid_cell == None:
-                                print("No audio or video objects.")
-                                print("Skipping file.\n")
-                                continue
+                                if audio_cell == None and vid_cell == None:
+                                        print("No audio or video objects.")
+                                        print("Skipping file.\n")
+                                        continue
 
-                        print("Audio Files:")
-                        download_loop(s3, bucket, audio_cell, args.outdir, out_writer)
+                                print("Audio Files:")
+                                download_loop(s3, bucket, audio_cell, args.outdir, out_writer)
                         
-                        print("Video Files:")
-                        download_loop(s3, bucket, vid_cell, args.outdir, out_writer)
-                        i += 1
+                                print("Video Files:")
+                                download_loop(s3, bucket, vid_cell, args.outdir, out_writer,
+                                              args.extract_audio, args.keep_video)
+                                i += 1
+
+if __name__=="__main__":
+        main()
@@ -0,0 +1,165 @@
+#!/usr/bin/python
+
+# Bulk reconcile of delivered VTTs against S3.
+#
+# Builds the set of VTTs that should be in the bucket (from the
+# transcription log, an upload inlist and/or a folder of local VTTs), lists
+# the media/<object id>/ prefixes with paginated list calls instead of one
+# HEAD per object, and compares by key, size and ETag. Writes:
+#   [out]_missing.csv  VTTs not in S3            (03 inlist format)
+#   [out]_stale.csv    VTTs whose S3 copy differs (03 inlist format)
+#   [out]_unverified.csv  VTTs in S3 with no local copy to compare (03 inlist format)
+#   [out]_extra.csv    VTTs in S3 that nothing expects
+# The missing and stale lists can be passed straight to s3_upload.py.
+
+import os, csv, hashlib
+import argparse
+import boto3
+
+from run_report import read_rows, file_key, object_id
+
+bucket = "car-archi-objects"
+media_prefix = "media/"
+# Above this many objects, list all of media/ instead of one prefix each
+max_prefix_lists = 50
+# boto3's default multipart chunk size, used to predict multipart ETags
+multipart_chunksize = 8 * 1024 * 1024
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("out", help="Prefix for output CSVs, e.g. reconcile/batch7",
+                        type=str)
+    parser.add_argument("--transcribe", default=None,
+                        help="Transcription log CSV (02_outlist.csv); SUCCESS rows are expected",
+                        type=str)
+    parser.add_argument("--inlist", default=None,
+                        help="Upload inlist CSV (Filepath, Filename, S3 URI)", type=str)
+    parser.add_argument("--local_dir", default=None,
+                        help="Folder of local VTTs; every VTT in it is expected", type=str)
+    parser.add_argument("--bucket", default=bucket, help="S3 bucket", type=str)
+    parser.add_argument("--endpoint_url", default=None,
+                        help="S3 endpoint URL, e.g. for a local S3-compatible server",
+                        type=str)
+    args = parser.parse_args()
+    return args
+
+
+def vtt_key(vtt_name):
+    return media_prefix + object_id(file_key(vtt_name)) + "/" + vtt_name
+
+
+# Expected VTTs: {S3 key: local filepath}
+def expected_vtts(args):
+    expected = {}
+    if args.transcribe:
+        for row in read_rows(args.transcribe, 6):
+            if row[5] == "SUCCESS" and row[1].endswith(".vtt"):
+                expected[vtt_key(row[1])] = row[0]
+    if args.inlist:
+        for row in read_rows(args.inlist, 3):
+            key = "/".join(row[2].split("/")[3:]) if row[2] else vtt_key(row[1])
+            expected[key] = row[0]
+    if args.local_dir:
+        for name in os.listdir(args.local_dir):
+            if name.endswith(".vtt"):
+                expected[vtt_key(name)] = os.path.join(args.local_dir, name)
+    return expected
+
+
+# List VTT objects under the given prefixes: {key: (size, etag)}
+def list_vtts(client, bucket, prefixes):
+    found, n_calls = {}, 0
+    paginator = client.get_paginator("list_objects_v2")
+    for prefix in prefixes:
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            n_calls += 1
+            for obj in page.get("Contents", []):
+                if obj["Key"].endswith(".vtt"):
+                    found[obj["Key"]] = (obj["Size"], obj["ETag"].strip('"'))
+    return found, n_calls
+
+
+# ETag S3 would give the local file: plain MD5, or MD5 of part MD5s
+# with a "-[parts]" suffix for multipart uploads
+def local_etag(fpath, s3_etag):
+    if "-" not in s3_etag:
+        h = hashlib.md5()
+        with open(fpath, "rb") as f:
+            for chunk in iter(lambda: f.read(multipart_chunksize), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    part_md5s = []
+    with open(fpath, "rb") as f:
+        for chunk in iter(lambda: f.read(multipart_chunksize), b""):
+            part_md5s.append(hashlib.md5(chunk).digest())
+    return hashlib.md5(b"".join(part_md5s)).hexdigest() + "-" + str(len(part_md5s))
+
+
+def write_upload_list(fpath, rows):
+    with open(fpath, "w", newline='') as f:
+        writer = csv.writer(f, delimiter=',')
+        writer.writerow(["Filepath", "Filename", "S3 URI"])
+        writer.writerows(rows)
+
+
+def main():
+    args = get_args()
+    for src in (args.transcribe, args.inlist, args.local_dir):
+        if src and not os.path.exists(src):
+            print("Input not found: ", src)
+            print("Exiting")
+            exit()
+    if not (args.transcribe or args.inlist or args.local_dir):
+        print("No expected VTTs. Use --transcribe, --inlist and/or --local_dir")
+        exit()
+    out_dir = os.path.dirname(args.out)
+    if out_dir and not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+
+    expected = expected_vtts(args)
+    obj_prefixes = sorted(set(k.rsplit("/", 1)[0] + "/" for k in expected))
+    print(f"Expecting {len(expected)} VTTs across {len(obj_prefixes)} objects")
+
+    client = boto3.client("s3", endpoint_url=args.endpoint_url)
+    prefixes = obj_prefixes if len(obj_prefixes) <= max_prefix_lists else [media_prefix]
+    found, n_calls = list_vtts(client, args.bucket, prefixes)
+    print(f"Listed {len(found)} VTT objects in {n_calls} list calls")
+
+    missing, stale, unverified, extra = [], [], [], []
+    for key, local_fpath in sorted(expected.items()):
+        s3_uri = "s3://" + args.bucket + "/" + key
+        row = [local_fpath, key.rsplit("/", 1)[-1], s3_uri]
+        if key not in found:
+            missing.append(row)
+            continue
+        size, etag = found[key]
+        if not os.path.exists(local_fpath):
+            unverified.append(row)      # In S3, but nothing local to compare against
+            continue
+        if os.path.getsize(local_fpath) != size or local_etag(local_fpath, etag) != etag:
+            stale.append(row)
+
+    # Extra: VTTs under the same object folders that nothing expects
+    obj_prefix_set = set(obj_prefixes)
+    for key, (size, etag) in sorted(found.items()):
+        if key not in expected and key.rsplit("/", 1)[0] + "/" in obj_prefix_set:
+            extra.append(["s3://" + args.bucket + "/" + key, size, etag])
+
+    write_upload_list(args.out + "_missing.csv", missing)
+    write_upload_list(args.out + "_stale.csv", stale)
+    write_upload_list(args.out + "_unverified.csv", unverified)
+    with open(args.out + "_extra.csv", "w", newline='') as f:
+        writer = csv.writer(f, delimiter=',')
+        writer.writerow(["S3 URI", "Size", "ETag"])
+        writer.writerows(extra)
+
+    print(f"OK: {len(expected) - len(missing) - len(stale) - len(unverified)}")
+    print(f"Missing: {len(missing)}  ->  {args.out}_missing.csv")
+    print(f"Stale: {len(stale)}  ->  {args.out}_stale.csv")
+    print(f"Unverified (no local VTT): {len(unverified)}  ->  {args.out}_unverified.csv")
+    print(f"Extra: {len(extra)}  ->  {args.out}_extra.csv")
+
+if __name__=="__main__":
+    main()
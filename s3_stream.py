@@ -0,0 +1,111 @@
+#!/usr/bin/python
+
+# Zero-disk audio decoding straight from S3 objects.
+#
+# Feeds an S3 object through an ffmpeg decode pipe into a 16 kHz mono
+# float32 array (the same output as whisper.load_audio), without writing
+# the media to local storage. Streamable formats are read with parallel
+# ranged GETs written to ffmpeg's stdin in order. MP4-family containers
+# may keep their index at the end of the file, so ffmpeg reads those from
+# a presigned URL and issues its own range requests to seek.
+
+import subprocess, threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sample_rate = 16000
+range_chunk_size = 8 * 1024 * 1024
+max_inflight_ranges = 4
+seek_required_exts = ["mov", "mp4", "m4a", "m4v", "mpeg4"]
+presigned_url_expiry = 3600
+
+
+# Split "s3://bucket/key" into (bucket, key)
+def split_s3_uri(s3_uri):
+    bucket, _, key = s3_uri.split("//", 1)[-1].partition("/")
+    return bucket, key
+
+
+def _ffmpeg_cmd(src, sr):
+    return ["ffmpeg", "-nostdin", "-threads", "0", "-v", "error",
+            "-i", src, "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le",
+            "-ar", str(sr), "-"]
+
+
+# Write the object to ffmpeg's stdin as ordered ranged GETs, keeping up to
+# max_inflight_ranges requests in flight
+def _feed_ranges(client, bucket, key, size, stdin, errors):
+    def get_range(start):
+        end = min(start + range_chunk_size, size) - 1
+        resp = client.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end}")
+        return resp["Body"].read()
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_inflight_ranges) as pool:
+            offsets = iter(range(0, size, range_chunk_size))
+            inflight = deque()
+            for offset in offsets:
+                inflight.append(pool.submit(get_range, offset))
+                if len(inflight) >= max_inflight_ranges:
+                    break
+            while inflight:
+                stdin.write(inflight.popleft().result())
+                offset = next(offsets, None)
+                if offset is not None:
+                    inflight.append(pool.submit(get_range, offset))
+    except BrokenPipeError:
+        pass                            # ffmpeg exited; its error is reported
+    except Exception as e:
+        errors.append(e)
+    finally:
+        try:
+            stdin.close()
+        except BrokenPipeError:
+            pass
+
+
+# Size in bytes of the object at an S3 URI
+def object_size(client, s3_uri):
+    bucket, key = split_s3_uri(s3_uri)
+    return client.head_object(Bucket=bucket, Key=key)["ContentLength"]
+
+
+# Decode an S3 object to a float32 audio array without touching local disk
+def stream_audio(client, s3_uri, sr=sample_rate):
+    bucket, key = split_s3_uri(s3_uri)
+    size = object_size(client, s3_uri)
+    if size == 0:
+        raise ValueError("Blank file: " + s3_uri)
+
+    ext = key.rsplit(".", 1)[-1].lower()
+    errors = []
+    if ext in seek_required_exts:
+        url = client.generate_presigned_url("get_object",
+            Params={"Bucket": bucket, "Key": key}, ExpiresIn=presigned_url_expiry)
+        proc = subprocess.Popen(_ffmpeg_cmd(url, sr), stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        out, err = proc.communicate()
+    else:
+        proc = subprocess.Popen(_ffmpeg_cmd("pipe:0", sr), stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        feeder = threading.Thread(target=_feed_ranges,
+            args=(client, bucket, key, size, proc.stdin, errors), daemon=True)
+        feeder.start()
+        # Drain stderr alongside stdout so neither pipe fills up
+        err_chunks = []
+        err_reader = threading.Thread(target=lambda: err_chunks.append(proc.stderr.read()),
+                                      daemon=True)
+        err_reader.start()
+        out = proc.stdout.read()
+        proc.wait()
+        feeder.join()
+        err_reader.join()
+        err = b"".join(err_chunks)
+
+    if errors:
+        raise errors[0]
+    if proc.returncode != 0:
+        raise RuntimeError(f"Failed to decode {s3_uri}: {err.decode(errors='replace').strip()}")
+    return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
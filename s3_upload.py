@@ -18,12 +18,15 @@ def get_args():
     args = parser.parse_args()
     return args
 
-def upload_file(s3_client, filename, bucket, object_name=None):
+def upload_file(s3_client, filename, bucket, object_name=None, config=None,
+                throttle=1):
     """Upload a file to an S3 bucket
 
     :param file_name: File to upload
     :param bucket: Bucket to upload to
     :param object_name: S3 object name. If not specified then file_name is used
+    :param config: boto3 TransferConfig for the upload, or None for defaults
+    :param throttle: Seconds to wait after each upload attempt
     :return: True if file was uploaded, else False
     """
     # If S3 object_name was not specified, use filename
@@ -33,12 +36,13 @@ def upload_file(s3_client, filename, bucket, object_name=None):
 
     # Upload the file
     try:
-        response = s3_client.upload_file(filename, bucket, object_name)
+        response = s3_client.upload_file(filename, bucket, object_name,
+                                         Config=config)
     except ClientError as e:
         logging.error(e)
-        time.sleep(1)
+        time.sleep(throttle)
         return False
-    time.sleep(1)
+    time.sleep(throttle)
     return True
 
 def update_log(log_writer, fpath, fname, uri, msg, result):
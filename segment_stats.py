@@ -0,0 +1,95 @@
+#!/usr/bin/python
+
+# Segment-level statistics for Whisper transcripts.
+#
+# Saves the per-segment decoder statistics Whisper already returns
+# (avg_logprob, compression_ratio, no_speech_prob, temperature) to a JSON
+# sidecar per transcript, and flags segments that look hallucinated,
+# looped or low-confidence so they can be re-decoded on their own.
+
+import os, json, tempfile
+
+stat_keys = ["id", "seek", "start", "end", "text", "avg_logprob",
+             "compression_ratio", "no_speech_prob", "temperature"]
+
+# Same defaults Whisper uses to decide a decode needs a fallback
+default_logprob_threshold = -1.0
+default_compression_ratio_threshold = 2.4
+default_no_speech_threshold = 0.6
+
+
+# Stats sidecar path for a transcript: [stats_dir]/[stem].json
+def stats_path(stats_dir, fname):
+    return os.path.join(stats_dir, os.path.splitext(os.path.basename(fname))[0] + ".json")
+
+
+def keep_stats(segment):
+    return {k: segment[k] for k in stat_keys if k in segment}
+
+
+def write_json(fpath, data):
+    out_dir = os.path.dirname(os.path.abspath(fpath))
+    fd, tmp_path = tempfile.mkstemp(dir=out_dir, suffix=".json.tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp_path, fpath)
+
+
+# Segment stats for a Whisper result
+def result_stats(result, source, model_name, extra=None):
+    stats = {"source": source, "model": model_name,
+             "language": result.get("language", ""),
+             "segments": [keep_stats(s) for s in result["segments"]]}
+    if extra:
+        stats.update(extra)
+    return stats
+
+
+def write_segment_stats(fpath, result, source, model_name, extra=None):
+    stats = result_stats(result, source, model_name, extra)
+    write_json(fpath, stats)
+    return stats
+
+
+def read_segment_stats(fpath):
+    with open(fpath) as f:
+        return json.load(f)
+
+
+# Returns a list of reasons a segment looks bad; empty if it looks fine
+def segment_flags(segment, prev_text="",
+                  logprob_threshold=default_logprob_threshold,
+                  compression_ratio_threshold=default_compression_ratio_threshold,
+                  no_speech_threshold=default_no_speech_threshold):
+    flags = []
+    if segment.get("compression_ratio", 0.0) > compression_ratio_threshold:
+        flags.append("compression_ratio")
+    if segment.get("avg_logprob", 0.0) < logprob_threshold:
+        # Text decoded over what the model thinks is silence
+        if segment.get("no_speech_prob", 0.0) > no_speech_threshold:
+            flags.append("no_speech")
+        else:
+            flags.append("avg_logprob")
+    text = segment.get("text", "").strip().lower()
+    if text and text == prev_text:
+        flags.append("repeat")
+    return flags
+
+
+# Group flagged segments into time windows to re-decode.
+# Flagged segments closer than merge_gap seconds are merged into one window.
+# Returns a list of (start, end, reasons).
+def flag_windows(segments, merge_gap=1.0, **thresholds):
+    windows = []
+    prev_text = ""
+    for s in segments:
+        flags = segment_flags(s, prev_text, **thresholds)
+        prev_text = s.get("text", "").strip().lower()
+        if not flags:
+            continue
+        if windows and s["start"] - windows[-1][1] <= merge_gap:
+            start, end, reasons = windows[-1]
+            windows[-1] = (start, max(end, s["end"]), reasons | set(flags))
+        else:
+            windows.append((s["start"], s["end"], set(flags)))
+    return [(start, end, sorted(reasons)) for start, end, reasons in windows]
@@ -0,0 +1,82 @@
+#!/usr/bin/python
+
+# Shared-memory Whisper weights for CPU worker processes.
+#
+# whisper.load_model() gives every process its own multi-GB copy of the
+# weights. Instead, prepare the float32 weights once into a file, ideally
+# on tmpfs (/dev/shm), and have each worker memory-map it read-only. The
+# kernel shares the mapped pages between all processes, so each extra
+# worker only costs its activations.
+#
+# Usage:
+#   python shared_weights.py [model name] [out .pt]   e.g. large-v3 /dev/shm/large-v3.pt
+#   python batchWhisper.py ... --shared_weights /dev/shm/large-v3.pt
+
+import os, tempfile
+import argparse
+
+import numpy as np
+import torch, whisper
+from whisper.model import Whisper, ModelDimensions
+
+
+# Write model weights as float32 in a memory-mappable checkpoint
+def prepare_weights(model_name, out_path):
+    model = whisper.load_model(model_name, device="cpu")
+    checkpoint = {
+        "name": model_name,
+        "dims": model.dims.__dict__,
+        "model_state_dict": {k: v.float().contiguous()
+                             for k, v in model.state_dict().items()},
+        # Non-persistent buffer, not in the state dict
+        "alignment_heads": model.alignment_heads.to_dense(),
+    }
+    out_dir = os.path.dirname(os.path.abspath(out_path))
+    fd, tmp_path = tempfile.mkstemp(dir=out_dir, suffix=".pt.tmp")
+    os.close(fd)
+    torch.save(checkpoint, tmp_path)
+    os.replace(tmp_path, out_path)
+
+
+# Build a Whisper model whose weights are read-only views of the mapped file.
+# Returns (model, name of the model the weights were prepared from).
+def load_shared_model(weights_path):
+    checkpoint = torch.load(weights_path, map_location="cpu",
+                            mmap=True, weights_only=True)
+    dims = ModelDimensions(**checkpoint["dims"])
+
+    # Build on the meta device so no private weight copies are allocated
+    with torch.device("meta"):
+        model = Whisper(dims)
+    model.load_state_dict(checkpoint["model_state_dict"], assign=True)
+
+    # Rebuild the non-persistent buffers that stayed on the meta device
+    mask = torch.empty(dims.n_text_ctx, dims.n_text_ctx).fill_(-np.inf).triu_(1)
+    model.decoder.register_buffer("mask", mask, persistent=False)
+    model.register_buffer("alignment_heads",
+        checkpoint["alignment_heads"].to_sparse(), persistent=False)
+
+    model.eval()
+    for p in model.parameters():
+        p.requires_grad_(False)
+    print("Attached to shared model weights: ", weights_path)
+    return model, checkpoint["name"]
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("model", help="Whisper model name, e.g. large-v3", type=str)
+    parser.add_argument("out", help="Output weights file, e.g. /dev/shm/large-v3.pt",
+                        type=str)
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    args = get_args()
+    print("Preparing shared weights for: ", args.model)
+    prepare_weights(args.model, args.out)
+    print("Wrote shared weights to: ", args.out)
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/python
+
+# Intra-file transcription checkpoints for long recordings.
+#
+# Transcribes decoded audio in chunks of checkpoint_interval seconds and,
+# after each chunk, saves the decoded segments and the resume position to
+# [checkpoint_dir]/[stem].[model].json. If the worker crashes or the node
+# is preempted, the next run resumes the file from its last checkpoint and
+# returns one continuous result, so the VTT is written as if the file had
+# been transcribed in one go.
+#
+# Each chunk is sliced from the decoded audio and its segment timestamps
+# are shifted by the chunk offset. Passing clip_timestamps over the whole
+# file instead would make Whisper recompute the full-file mel spectrogram
+# for every chunk.
+
+import os
+
+from segment_stats import write_json, read_segment_stats
+
+sample_rate = 16000
+frames_per_second = 100                 # Whisper mel frames (hop length 160)
+default_interval = 600
+
+
+def add_checkpoint_args(parser):
+    parser.add_argument("--checkpoint_dir", default=None,
+                        help="Local folder for intra-file transcription checkpoints",
+                        type=str, required=False)
+    parser.add_argument("--checkpoint_interval", default=default_interval,
+                        help="Seconds of audio transcribed between checkpoints",
+                        type=float, required=False)
+
+
+# Checkpoint path for a file and model: [checkpoint_dir]/[stem].[model].json
+def checkpoint_path(checkpoint_dir, fname, model_name):
+    stem = os.path.splitext(os.path.basename(fname))[0]
+    return os.path.join(checkpoint_dir, f"{stem}.{os.path.basename(model_name)}.json")
+
+
+# Remove all checkpoints for a file once its transcript is written
+def remove_checkpoints(checkpoint_dir, fname):
+    stem = os.path.splitext(os.path.basename(fname))[0] + "."
+    for name in os.listdir(checkpoint_dir):
+        if name.startswith(stem) and name.endswith(".json"):
+            os.remove(os.path.join(checkpoint_dir, name))
+
+
+# Load a checkpoint if it belongs to this source, model and chunk size
+def read_checkpoint(fpath, source, model_name, interval):
+    if not os.path.exists(fpath):
+        return None
+    try:
+        ckpt = read_segment_stats(fpath)
+    except (OSError, ValueError):
+        print("Ignoring unreadable checkpoint: ", fpath)
+        return None
+    if (ckpt.get("source") != source or ckpt.get("model") != model_name
+            or ckpt.get("interval") != interval):
+        print("Ignoring checkpoint from a different run: ", fpath)
+        return None
+    return ckpt
+
+
+# Shift a chunk's segment times to the position of the chunk in the file
+def shift_segment(segment, offset):
+    segment["seek"] += int(round(offset * frames_per_second))
+    segment["start"] = round(segment["start"] + offset, 3)
+    segment["end"] = round(segment["end"] + offset, 3)
+    for word in segment.get("words", []):
+        word["start"] = round(word["start"] + offset, 3)
+        word["end"] = round(word["end"] + offset, 3)
+    return segment
+
+
+# Transcribe audio chunk by chunk with transcribe_fn(audio, language),
+# checkpointing after each chunk. Returns a Whisper result dict.
+def transcribe_checkpointed(transcribe_fn, audio, ckpt_fpath, source,
+                            model_name, interval=default_interval):
+    duration = len(audio) / sample_rate
+    if duration <= interval:
+        return transcribe_fn(audio, None)
+
+    ckpt = read_checkpoint(ckpt_fpath, source, model_name, interval)
+    if ckpt is None:
+        ckpt = {"source": source, "model": model_name, "interval": interval,
+                "duration": duration, "language": None, "position": 0.0,
+                "segments": []}
+    else:
+        print(f"Resuming from checkpoint at {ckpt['position']} of "
+              f"{round(duration, 1)} seconds")
+
+    while ckpt["position"] < duration:
+        start = ckpt["position"]
+        end = min(start + interval, duration)
+        # Keep the language of the first chunk for the rest of the file
+        result = transcribe_fn(audio[int(start * sample_rate):int(end * sample_rate)],
+                               ckpt["language"])
+        ckpt["language"] = ckpt["language"] or result["language"]
+        chunk = result["segments"]
+
+        # The last segment may be cut off at the chunk edge, so re-decode
+        # it at the start of the next chunk
+        if end < duration and len(chunk) > 1 and chunk[-1]["start"] > 0:
+            end = start + chunk[-1]["start"]
+            chunk = chunk[:-1]
+
+        ckpt["segments"] += [shift_segment(s, start) for s in chunk]
+        ckpt["position"] = end
+        write_json(ckpt_fpath, ckpt)
+        print(f"Checkpointed {round(end, 1)} of {round(duration, 1)} seconds")
+
+    for i, s in enumerate(ckpt["segments"]):
+        s["id"] = i
+    return {"text": "".join(s["text"] for s in ckpt["segments"]),
+            "segments": ckpt["segments"], "language": ckpt["language"]}
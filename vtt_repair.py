@@ -0,0 +1,164 @@
+#!/usr/bin/python
+
+# Targeted re-transcription of bad windows in an existing VTT.
+#
+# Uses the segment statistics saved by batchWhisper.py --stats_dir to find
+# windows that look hallucinated, looped or low-confidence, re-decodes only
+# those stretches of audio with stricter settings, and splices the new cues
+# into the existing VTT. The FADGI header and all other cues are left
+# byte-identical, and the stats sidecar is updated to match.
+#
+# Usage: python vtt_repair.py [vtt] [source A/V file] [stats JSON]
+
+from datetime import datetime
+
+import os
+import argparse
+
+import whisper, torch
+
+import batchWhisper as bw
+import segment_stats as ss
+from vtt_utils import read_vtt, write_vtt
+
+# Decode settings for repair passes; a --w_settings file overrides these
+repair_defaults = {
+    "beam_size": 5,
+    "best_of": 5,
+    "logprob_threshold": -0.8,
+    "condition_on_previous_text": False,
+    "temperature": (0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+}
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("vtt", help="Local filepath to VTT to repair", type=str)
+    parser.add_argument("audio", help="Local filepath to source A/V file", type=str)
+    parser.add_argument("stats", help="Segment statistics JSON for the VTT", type=str)
+    parser.add_argument("--w_settings", default=None,
+                        help="Text file of Whisper settings for the repair pass",
+                        type=str, required=False)
+    parser.add_argument("--model", default=None,
+                        help="Model for the repair pass. Defaults to the model in the stats file",
+                        type=str, required=False)
+    parser.add_argument("--logprob_threshold", default=ss.default_logprob_threshold,
+                        help="Flag segments with avg_logprob below this", type=float)
+    parser.add_argument("--compression_ratio_threshold",
+                        default=ss.default_compression_ratio_threshold,
+                        help="Flag segments with compression_ratio above this", type=float)
+    parser.add_argument("--no_speech_threshold", default=ss.default_no_speech_threshold,
+                        help="Flag low-confidence segments with no_speech_prob above this",
+                        type=float)
+    parser.add_argument("--merge_gap", default=1.0,
+                        help="Merge flagged segments closer than this many seconds",
+                        type=float)
+    parser.add_argument("--dry_run", action="store_true",
+                        help="Only list the windows that would be re-decoded")
+    args = parser.parse_args()
+    return args
+
+
+def midpoint(start, end):
+    return (start + end) / 2.0
+
+
+def in_windows(start, end, windows):
+    mid = midpoint(start, end)
+    return any(w_start <= mid <= w_end for w_start, w_end, reasons in windows)
+
+
+# Re-decode one window of audio. Returns segments with absolute timestamps.
+def redecode_window(model, audio, start, end, w_settings, decode_options, device):
+    s0 = int(start * whisper.audio.SAMPLE_RATE)
+    s1 = int(end * whisper.audio.SAMPLE_RATE)
+    result = bw.run_transcribe(model, audio[s0:s1], w_settings,
+        decode_options, device)
+
+    segments = []
+    for seg in result["segments"]:
+        if not seg["text"].strip():
+            continue
+        # Still looks like speech decoded over silence: drop it
+        if seg["no_speech_prob"] > w_settings.get("no_speech_threshold", 0.6) \
+                and seg["avg_logprob"] < w_settings.get("logprob_threshold", -1.0):
+            continue
+        seg["start"] = min(seg["start"] + start, end)
+        seg["end"] = min(seg["end"] + start, end)
+        segments.append(seg)
+    return segments
+
+
+# Replace cues inside the windows with new ones, keeping all others as-is
+def splice_cues(cues, windows, new_segments):
+    kept, last_start = [], 0.0
+    for cue in cues:
+        if cue["start"] is not None:
+            if in_windows(cue["start"], cue["end"], windows):
+                continue
+            last_start = cue["start"]
+        kept.append((last_start, cue))
+    for seg in new_segments:
+        kept.append((seg["start"], {"start": seg["start"], "end": seg["end"],
+                                    "text": seg["text"].strip().replace("-->", "->")}))
+    kept.sort(key=lambda c: c[0])
+    return [cue for start, cue in kept]
+
+
+def main():
+    args = get_args()
+    for fpath in (args.vtt, args.audio, args.stats):
+        if not os.path.exists(fpath):
+            bw.exit_msg("Filepath not found: ", fpath)
+
+    stats = ss.read_segment_stats(args.stats)
+    windows = ss.flag_windows(stats["segments"], merge_gap=args.merge_gap,
+        logprob_threshold=args.logprob_threshold,
+        compression_ratio_threshold=args.compression_ratio_threshold,
+        no_speech_threshold=args.no_speech_threshold)
+
+    total = sum(end - start for start, end, reasons in windows)
+    print(f"Flagged {len(windows)} windows, {total:.1f} seconds of audio")
+    for start, end, reasons in windows:
+        print(f"    {start:>9.2f} - {end:>9.2f}  {', '.join(reasons)}")
+    if not windows or args.dry_run:
+        return
+
+    w_settings = dict(repair_defaults)
+    if args.w_settings and os.path.exists(args.w_settings):
+        w_settings.update(bw.read_w_settings(args.w_settings))
+    w_settings["model"] = args.model or stats.get("model") or bw.default_model
+    # Keep the language found in the first pass instead of re-detecting it
+    if stats.get("language") and "language" not in w_settings:
+        w_settings["language"] = stats["language"]
+    decode_options = bw.get_decode_options(w_settings)
+
+    device = "cuda:0" if torch.cuda.is_available() else "cpu"
+    w_settings.setdefault("device", device)
+    model, model_name = bw.load_asr_model(w_settings, device)
+    audio = whisper.load_audio(args.audio)
+
+    new_segments = []
+    for start, end, reasons in windows:
+        print(f"Re-decoding {start:.2f} - {end:.2f}")
+        new_segments += redecode_window(model, audio, start, end,
+            w_settings, decode_options, device)
+
+    header, cues = read_vtt(args.vtt)
+    write_vtt(args.vtt, header, splice_cues(cues, windows, new_segments))
+    print("Spliced ", len(new_segments), " new cues into: ", args.vtt)
+
+    # Keep stats in step with the VTT so later passes see the new segments
+    segments = [s for s in stats["segments"]
+                if not in_windows(s["start"], s["end"], windows)]
+    segments += [ss.keep_stats(s) for s in new_segments]
+    stats["segments"] = sorted(segments, key=lambda s: s["start"])
+    stats.setdefault("repairs", []).append({
+        "date": datetime.today().strftime('%Y-%m-%d'),
+        "model": model_name,
+        "windows": [[start, end, reasons] for start, end, reasons in windows]})
+    ss.write_json(args.stats, stats)
+    print("Updated segment statistics: ", args.stats)
+
+if __name__=="__main__":
+    main()
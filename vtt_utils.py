@@ -0,0 +1,110 @@
+#!/usr/bin/python
+
+# Small WebVTT helpers for editing transcripts in place.
+#
+# Splits a VTT into its header (the WEBVTT line plus any embedded FADGI
+# metadata block) and its cues, keeping the raw text of every cue so
+# untouched cues are written back byte-identical.
+
+import os, re, tempfile
+
+timing_re = re.compile(r"^\s*((?:\d+:)?\d+:\d+\.\d+)\s+-->\s+((?:\d+:)?\d+:\d+\.\d+)")
+
+
+def parse_timestamp(ts):
+    parts = ts.split(":")
+    seconds = float(parts[-1])
+    if len(parts) == 3:
+        return int(parts[0]) * 3600 + int(parts[1]) * 60 + seconds
+    return int(parts[0]) * 60 + seconds
+
+
+# Format seconds the way Whisper's VTT writer does: [HH:]MM:SS.mmm
+def format_timestamp(seconds):
+    ms = int(round(seconds * 1000.0))
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    secs, ms = divmod(ms, 1000)
+    hours_marker = f"{hours:02d}:" if hours > 0 else ""
+    return f"{hours_marker}{minutes:02d}:{secs:02d}.{ms:03d}"
+
+
+def format_cue(start, end, text):
+    return f"{format_timestamp(start)} --> {format_timestamp(end)}\n{text}\n\n"
+
+
+# Split VTT text into (header, cues). header is the raw text before the
+# first cue. Each cue is a dict with start, end, text and its raw block.
+def parse_vtt(vtt_text):
+    blocks = re.split(r"(\n\s*\n)", vtt_text)
+    header, cues = "", []
+    in_header = True
+    for i in range(0, len(blocks), 2):
+        block = blocks[i]
+        sep = blocks[i + 1] if i + 1 < len(blocks) else ""
+        lines = block.strip("\n").split("\n")
+        timing = None
+        for line in lines[:2]:
+            timing = timing_re.match(line)
+            if timing:
+                break
+        if in_header and timing is None:
+            header += block + sep
+            continue
+        in_header = False
+        if not block.strip() and cues:
+            cues[-1]["raw"] += block + sep
+            continue
+        if timing is None:
+            # NOTE/STYLE blocks after the first cue are kept as-is
+            cues.append({"start": None, "end": None, "text": "", "raw": block + sep})
+            continue
+        text_lines = lines[lines.index(timing.string) + 1:]
+        cues.append({"start": parse_timestamp(timing.group(1)),
+                     "end": parse_timestamp(timing.group(2)),
+                     "text": "\n".join(text_lines),
+                     "raw": block + sep})
+    return header, cues
+
+
+def read_vtt(fpath):
+    with open(fpath, encoding="utf-8", newline='') as f:
+        return parse_vtt(f.read())
+
+
+# Write header and cues atomically, so a crash never leaves a partial VTT
+def write_vtt(fpath, header, cues):
+    out_dir = os.path.dirname(os.path.abspath(fpath))
+    fd, tmp_path = tempfile.mkstemp(dir=out_dir, suffix=".vtt.tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline='') as f:
+            f.write(header)
+            last = header
+            for cue in cues:
+                if "raw" in cue:
+                    chunk = cue["raw"]
+                else:
+                    chunk = format_cue(cue["start"], cue["end"], cue["text"])
+                    # Keep a blank line between an unchanged final cue and new ones
+                    if last and not last.endswith("\n\n"):
+                        f.write("\n" if last.endswith("\n") else "\n\n")
+                f.write(chunk)
+                if chunk:
+                    last = chunk
+        os.replace(tmp_path, fpath)
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# Cue text with WebVTT timestamp tags before each word after the first,
+# e.g. "Hello <00:01.250>there". Words without timing are left untagged.
+def word_timed_text(words):
+    parts = []
+    for n, w in enumerate(words):
+        word = w["word"].strip().replace("-->", "->")
+        if n > 0 and w.get("start") is not None:
+            word = "<" + format_timestamp(w["start"]) + ">" + word
+        parts.append(word)
+    return " ".join(parts)
@@ -0,0 +1,201 @@
+#!/usr/bin/python
+
+# Shared work queue for running batchWhisper.py on several nodes.
+#
+# Inlist rows are stored in a shared SQLite file. Each node claims one row
+# at a time under a time-limited lease and renews it with heartbeats while
+# transcribing. If a node dies, its lease expires and the row goes back to
+# the queue for another node. Rows that keep expiring are marked FAILED
+# after max_attempts so a file that crashes nodes can't stall the batch.
+#
+# Keep the database on storage every node can lock (a local disk for a
+# single machine, or a shared filesystem with working POSIX locks).
+#
+# Usage:
+#   python work_queue.py load [db] [inlist]   add inlist rows to the queue
+#   python work_queue.py status [db]          count rows per state
+#   python work_queue.py requeue [db]         return FAILED rows to the queue
+
+import os, csv, json, time, socket, sqlite3, threading
+import argparse
+
+default_lease = 600         # seconds
+default_max_attempts = 3
+
+schema = """CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    row TEXT UNIQUE NOT NULL,
+    state TEXT NOT NULL DEFAULT 'PENDING',
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated REAL)"""
+
+
+def default_node_name():
+    return socket.gethostname() + ":" + str(os.getpid())
+
+
+class SQLiteWorkQueue(object):
+    ''' Leased work queue backed by a shared SQLite file
+
+    : param db_path     : String, path of the shared SQLite database
+    : param lease       : Number, seconds a claim stays valid without heartbeat
+    : param max_attempts: Int, claims before a row is marked FAILED
+    '''
+    def __init__(self, db_path, lease=default_lease,
+                 max_attempts=default_max_attempts):
+        self._db_path = db_path
+        self._lease = lease
+        self._max_attempts = max_attempts
+        self._local = threading.local()
+        self._conn().execute(schema)
+
+    # One connection per thread; sqlite3 connections can't be shared
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._db_path, timeout=60,
+                                   isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    # Add rows from an inlist CSV. Rows already queued are ignored, so
+    # every node can safely load the same inlist.
+    def load_inlist(self, inlist):
+        conn = self._conn()
+        with open(inlist, newline='') as inlist_obj:
+            in_reader = csv.reader(inlist_obj, delimiter=',')
+            next(in_reader)
+            conn.execute("BEGIN IMMEDIATE")
+            before = conn.total_changes
+            for row in in_reader:
+                if not any(row):
+                    continue
+                conn.execute("INSERT OR IGNORE INTO jobs (row, updated) VALUES (?, ?)",
+                             (json.dumps(row), time.time()))
+            added = conn.total_changes - before
+            conn.execute("COMMIT")
+        return added
+
+    # Claim the next pending or expired row. Returns (job_id, row) or None.
+    def claim(self, node):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Expired leases that used up their attempts are given up on
+            conn.execute("""UPDATE jobs SET state = 'FAILED', owner = NULL, updated = ?
+                WHERE state = 'LEASED' AND lease_expires < ? AND attempts >= ?""",
+                (now, now, self._max_attempts))
+            job = conn.execute("""SELECT id, row FROM jobs
+                WHERE state = 'PENDING' OR (state = 'LEASED' AND lease_expires < ?)
+                ORDER BY id LIMIT 1""", (now,)).fetchone()
+            if job is not None:
+                conn.execute("""UPDATE jobs SET state = 'LEASED', owner = ?,
+                    lease_expires = ?, attempts = attempts + 1, updated = ?
+                    WHERE id = ?""", (node, now + self._lease, now, job[0]))
+            conn.execute("COMMIT")
+        except:
+            conn.execute("ROLLBACK")
+            raise
+        if job is None:
+            return None
+        return job[0], json.loads(job[1])
+
+    # Extend a lease. Returns False if this node no longer holds it.
+    def heartbeat(self, job_id, node):
+        now = time.time()
+        cur = self._conn().execute("""UPDATE jobs SET lease_expires = ?, updated = ?
+            WHERE id = ? AND owner = ? AND state = 'LEASED'""",
+            (now + self._lease, now, job_id, node))
+        return cur.rowcount == 1
+
+    def complete(self, job_id, node):
+        self._conn().execute("""UPDATE jobs SET state = 'DONE', updated = ?
+            WHERE id = ? AND owner = ?""", (time.time(), job_id, node))
+
+    # Give a row back to the queue without counting the attempt
+    def release(self, job_id, node):
+        self._conn().execute("""UPDATE jobs SET state = 'PENDING', owner = NULL,
+            attempts = MAX(attempts - 1, 0), updated = ?
+            WHERE id = ? AND owner = ? AND state = 'LEASED'""",
+            (time.time(), job_id, node))
+
+    def requeue_failed(self):
+        cur = self._conn().execute("""UPDATE jobs SET state = 'PENDING', owner = NULL,
+            attempts = 0, updated = ? WHERE state = 'FAILED'""", (time.time(),))
+        return cur.rowcount
+
+    def counts(self):
+        return dict(self._conn().execute(
+            "SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
+    # Yield claimed rows until the queue is empty. The lease is renewed in
+    # the background while the caller works on a row, and the row is marked
+    # DONE when the caller asks for the next one.
+    def iter_rows(self, node):
+        while True:
+            job = self.claim(node)
+            if job is None:
+                return
+            job_id, row = job
+            heartbeat = LeaseHeartbeat(self, job_id, node)
+            heartbeat.start()
+            try:
+                yield row
+            except GeneratorExit:
+                heartbeat.stop()
+                self.release(job_id, node)
+                raise
+            heartbeat.stop()
+            self.complete(job_id, node)
+
+
+class LeaseHeartbeat(threading.Thread):
+    ''' Background thread renewing a job lease every third of the lease time
+    '''
+    def __init__(self, work_queue, job_id, node):
+        super().__init__(daemon=True)
+        self._queue = work_queue
+        self._job_id = job_id
+        self._node = node
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self._queue._lease / 3):
+            if not self._queue.heartbeat(self._job_id, self._node):
+                print("Lost lease on job ", self._job_id)
+                return
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["load", "status", "requeue"])
+    parser.add_argument("db", help="Path to shared SQLite queue", type=str)
+    parser.add_argument("inlist", nargs="?", default=None,
+                        help="Input CSV to load (load only)", type=str)
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    args = get_args()
+    wq = SQLiteWorkQueue(args.db)
+    if args.command == "load":
+        if not args.inlist or not os.path.exists(args.inlist):
+            print("Filepath for inlist not found: ", args.inlist)
+            print("Exiting")
+            exit()
+        print("Added rows: ", wq.load_inlist(args.inlist))
+    elif args.command == "requeue":
+        print("Requeued rows: ", wq.requeue_failed())
+    for state, n in sorted(wq.counts().items()):
+        print(f"{state:<8} {n}")
+
+if __name__=="__main__":
+    main()